@@ -345,6 +345,9 @@ class HexStrikeExecution(models.Model):
         ('success', '成功'),
         ('failed', '失败'),
     ]
+    # 执行结束时回写的字段（配合 save(update_fields=...) 只更新变化的列）
+    RESULT_FIELDS = ('status', 'finished_at', 'execution_time', 'result', 'error_message')
+    FAILURE_FIELDS = ('status', 'finished_at', 'execution_time', 'error_message')
     
     target = models.CharField(max_length=255, db_index=True, verbose_name='评估目标', help_text='IP、域名或主机名')
     analysis_type = models.CharField(max_length=50, default='comprehensive', verbose_name='分析类型')
@@ -2,11 +2,25 @@
 HexStrike 扫描报告生成器
 生成美观的 HTML 安全评估报告
 """
-import os
 import json
+import re
+import sys
+from collections import defaultdict
 from datetime import datetime
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
 from django.conf import settings
+from app.services.report_triggers import NMAP_TRIGGERS_RE, NUCLEI_TRIGGERS_RE, scan_keywords
+
+# 严重性等级（按展示顺序）
+SEVERITY_ORDER = ('critical', 'high', 'medium', 'low', 'info')
+# 小写严重性 -> 驻留后的规范键，后续字典索引可走字符串同一性快速路径
+SEVERITY_KEYS = {s: sys.intern(s) for s in SEVERITY_ORDER}
+
+# 高风险端口与服务
+CRITICAL_PORTS = frozenset({22, 23, 135, 139, 445, 3389})
+CRITICAL_SERVICES = frozenset({'telnet', 'ftp', 'rsh', 'rlogin'})
 
 
 class HexStrikeHTMLReporter:
@@ -20,12 +34,10 @@ class HexStrikeHTMLReporter:
             reports_dir: 报告保存目录，默认为 BASE_DIR/reports
         """
         if reports_dir is None:
-            from pathlib import Path
-            base_dir = Path(settings.BASE_DIR)
-            reports_dir = base_dir / 'reports'
+            reports_dir = Path(settings.BASE_DIR) / 'reports'
 
-        self.reports_dir = reports_dir
-        os.makedirs(self.reports_dir, exist_ok=True)
+        self.reports_dir = Path(reports_dir)
+        self.reports_dir.mkdir(parents=True, exist_ok=True)
 
     def generate_report(
         self,
@@ -386,10 +398,10 @@ class HexStrikeHTMLReporter:
                     for line in lines:
                         try:
                             vuln = json.loads(line)
-                            severity = vuln.get('info', {}).get('severity', 'info').lower()
-                            if severity in stats['vulnerabilities']:
-                                stats['vulnerabilities'][severity] += 1
-                                stats['vulnerabilities']['total'] += 1
+                            # 未知严重性按 info 计数，与漏洞列表的归类保持一致
+                            severity = SEVERITY_KEYS.get(vuln.get('info', {}).get('severity', 'info').lower(), 'info')
+                            stats['vulnerabilities'][severity] += 1
+                            stats['vulnerabilities']['total'] += 1
                         except json.JSONDecodeError:
                             pass
             except Exception as e:
@@ -401,7 +413,6 @@ class HexStrikeHTMLReporter:
                 stdout = nmap_results.get('stdout', '')
                 if stdout:
                     # 简单的端口统计（从文本输出中提取）
-                    import re
                     port_matches = re.findall(r'(\d+)/tcp\s+open', stdout)
                     stats['ports']['open'] = len(port_matches)
                     stats['ports']['total'] = len(port_matches)
@@ -420,32 +431,24 @@ class HexStrikeHTMLReporter:
             if not stdout:
                 return ''
 
-            # 解析漏洞
-            vulnerabilities = []
-            lines = stdout.strip().split('\n')
-            for line in lines:
+            # 解析漏洞并按严重性分组（单次遍历，未知等级归入 info）
+            by_severity = defaultdict(list)
+            for line in stdout.strip().split('\n'):
                 try:
                     vuln = json.loads(line)
-                    vulnerabilities.append(vuln)
                 except json.JSONDecodeError:
-                    pass
+                    continue
+                severity = SEVERITY_KEYS.get(vuln.get('info', {}).get('severity', 'info').lower(), 'info')
+                by_severity[severity].append(vuln)
 
-            if not vulnerabilities:
+            if not by_severity:
                 return '<div class="section"><h2 class="section-title">🎉 未发现漏洞</h2><p>扫描完成，未发现已知漏洞。</p></div>'
 
-            # 按严重性分组
-            by_severity = {'critical': [], 'high': [], 'medium': [], 'low': [], 'info': []}
-            for vuln in vulnerabilities:
-                severity = vuln.get('info', {}).get('severity', 'info').lower()
-                if severity not in by_severity:
-                    severity = 'info'
-                by_severity[severity].append(vuln)
-
             # 生成 HTML
             html = '<div class="section"><h2 class="section-title">🔍 漏洞扫描结果</h2>'
 
-            for severity in ['critical', 'high', 'medium', 'low', 'info']:
-                vulns = by_severity.get(severity, [])
+            for severity in SEVERITY_ORDER:
+                vulns = by_severity.get(severity)
                 if not vulns:
                     continue
 
@@ -500,7 +503,6 @@ class HexStrikeHTMLReporter:
                 return ''
 
             # 解析端口信息
-            import re
             port_pattern = re.compile(r'(\d+)/tcp\s+open\s+(\S+)(?:\s+(.+))?')
 
             ports = []
@@ -527,14 +529,14 @@ class HexStrikeHTMLReporter:
                 version = port_info['version']
 
                 # 风险评估
-                risk = self._assess_port_risk(port, service)
+                risk_level, risk_label = self._assess_port_risk(port, service)
 
                 html += f'''
                 <div class="port-item open">
                     <div class="port-number">端口 {port}/tcp</div>
                     <div class="service">
                         服务：{service}
-                        {f'<span class="risk-badge risk-{risk["level"]}">{risk["label"]}</span>' if risk else ''}
+                        <span class="risk-badge risk-{risk_level}">{risk_label}</span>
                     </div>
                     {f'<div style="font-size: 12px; color: #999; margin-top: 5px;">{version}</div>' if version else ''}
                 </div>'''
@@ -551,9 +553,9 @@ class HexStrikeHTMLReporter:
 
         # 基于 Nmap 结果的建议
         if nmap_results and nmap_results.get('success'):
-            stdout = nmap_results.get('stdout', '')
+            hits = scan_keywords(NMAP_TRIGGERS_RE, nmap_results.get('stdout', ''), 3)
 
-            if 'ssh' in stdout.lower():
+            if 'ssh' in hits:
                 recommendations.append({
                     'title': '🔐 SSH 安全加固',
                     'items': [
@@ -564,7 +566,7 @@ class HexStrikeHTMLReporter:
                     ]
                 })
 
-            if 'elasticsearch' in stdout.lower() or ':9200' in stdout:
+            if 'elasticsearch' in hits or ':9200' in hits:
                 recommendations.append({
                     'title': '🔍 Elasticsearch 安全加固',
                     'items': [
@@ -578,8 +580,7 @@ class HexStrikeHTMLReporter:
         # 基于 Nuclei 结果的建议
         if nuclei_results and nuclei_results.get('success'):
             try:
-                stdout = nuclei_results.get('stdout', '')
-                if 'critical' in stdout.lower() or 'high' in stdout.lower():
+                if scan_keywords(NUCLEI_TRIGGERS_RE, nuclei_results.get('stdout', ''), 1):
                     recommendations.append({
                         'title': '🚨 漏洞修复优先级',
                         'items': [
@@ -610,17 +611,15 @@ class HexStrikeHTMLReporter:
         html += '</div>'
         return html
 
-    def _assess_port_risk(self, port: str, service: str) -> Optional[Dict]:
-        """评估端口风险"""
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _assess_port_risk(port: str, service: str) -> Tuple[str, str]:
+        """评估端口风险，返回 (level, label)"""
         port_num = int(port) if port.isdigit() else 0
-        service_lower = service.lower()
-
-        critical_ports = [22, 23, 135, 139, 445, 3389]
-        critical_services = ['telnet', 'ftp', 'rsh', 'rlogin']
 
-        if port_num in critical_ports or service_lower in critical_services:
-            return {'level': 'critical', 'label': '严重'}
+        if port_num in CRITICAL_PORTS or service.lower() in CRITICAL_SERVICES:
+            return ('critical', '严重')
         elif port_num < 1024:
-            return {'level': 'medium', 'label': '中危'}
+            return ('medium', '中危')
         else:
-            return {'level': 'low', 'label': '低危'}
\ No newline at end of file
+            return ('low', '低危')
\ No newline at end of file
@@ -5,14 +5,327 @@ HexStrike 扫描报告 PDF 生成器
 参考 SysReptor 的 PDF 生成架构
 """
 import os
+import re
+import json
 import logging
-from typing import Dict, Any, Optional, List
+import importlib.util
+from io import BytesIO
+from html import escape
+from string import Template
+from typing import Dict, Any, Optional, List, Iterator, Tuple
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from django.conf import settings
+from app.services.report_triggers import NMAP_TRIGGERS_RE, NUCLEI_TRIGGERS_RE, scan_keywords
 
 logger = logging.getLogger(__name__)
 
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import (
+        SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+    )
+    HAS_REPORTLAB = True
+except ImportError:
+    HAS_REPORTLAB = False
+
+# 备用 PDF 引擎只探测是否安装，真正导入推迟到 ReportLab 失败时
+HAS_WEASYPRINT = importlib.util.find_spec('weasyprint') is not None
+HAS_XHTML2PDF = importlib.util.find_spec('xhtml2pdf') is not None
+
+try:
+    import orjson
+    json_loads = orjson.loads
+    HAS_ORJSON = True
+except ImportError:
+    json_loads = json.loads
+    HAS_ORJSON = False
+
+# PDF 落盘缓冲区大小（1 MiB），减少大报告的 write 系统调用次数
+PDF_WRITE_BUFFER_SIZE = 1 << 20
+
+# 大表格拆分阈值：ReportLab 对超长单表的分页开销是超线性的
+TABLE_CHUNK_ROWS = 200
+
+# Nmap 文本输出中的开放端口行：端口号、服务、版本
+PORT_RE = re.compile(r'(\d+)/tcp\s+open\s+(\S+)(?:\s+(.+))?')
+
+# 每个严重性等级在报告中最多展示的漏洞条数
+MAX_VULNS_PER_SEVERITY = 20
+
+# 目标转文件名：单次替换 . : 以及路径分隔符，防止目标中的 / 造成目录穿越
+FILENAME_TRANS = str.maketrans({'.': '_', ':': '_', '/': '_', '\\': '_'})
+
+# 中文字体候选路径（macOS / Linux），按优先级排列
+CHINESE_FONT_CANDIDATES = (
+    '/System/Library/Fonts/PingFang.ttc',
+    '/System/Library/Fonts/STHeiti Light.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+    '/usr/share/fonts/wqy-zenhei/wqy-zenhei.ttc',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+)
+
+# 高风险端口与服务
+CRITICAL_PORTS = frozenset({22, 23, 135, 139, 445, 3389})
+CRITICAL_SERVICES = frozenset({'telnet', 'ftp', 'rsh', 'rlogin'})
+
+# 严重性等级（按展示顺序）
+SEVERITY_ORDER = ('critical', 'high', 'medium', 'low', 'info')
+
+SEVERITY_LABELS = {
+    'critical': '严重',
+    'high': '高危',
+    'medium': '中危',
+    'low': '低危',
+    'info': '信息'
+}
+
+
+@lru_cache(maxsize=1)
+def _register_font() -> str:
+    """注册中文字体（如果可用），进程内只执行一次，返回字体名"""
+    for font_path in CHINESE_FONT_CANDIDATES:
+        # 先检查文件是否存在，避免 TTFont 对不存在的路径做打开/解析
+        if not os.path.exists(font_path):
+            continue
+        try:
+            pdfmetrics.registerFont(TTFont('ChineseFont', font_path, subfontIndex=0))
+            return 'ChineseFont'
+        except Exception as e:
+            logger.debug(f"注册字体失败 {font_path}: {e}")
+    return 'Helvetica'  # 回退到默认字体
+
+
+@lru_cache(maxsize=1)
+def _get_weasyprint_font_config() -> Any:
+    """进程内共享的 WeasyPrint 字体配置，避免每次渲染都重新初始化 fontconfig"""
+    from weasyprint.text.fonts import FontConfiguration
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=4)
+def _get_weasyprint_css(css_text: str) -> Any:
+    """解析并缓存 WeasyPrint 样式表对象，同一份 CSS 在进程内只解析一次"""
+    from weasyprint import CSS
+    return CSS(string=css_text, font_config=_get_weasyprint_font_config())
+
+
+@lru_cache(maxsize=1)
+def _get_reportlab_styles() -> Dict[str, Any]:
+    """构建并缓存 ReportLab 段落样式"""
+    font_name = _register_font()
+    base = getSampleStyleSheet()
+    severity_colors = {
+        'critical': colors.HexColor('#e74c3c'),
+        'high': colors.HexColor('#e67e22'),
+        'medium': colors.HexColor('#f39c12'),
+        'low': colors.HexColor('#3498db'),
+        'info': colors.HexColor('#95a5a6')
+    }
+
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=base['Heading1'],
+            fontName=font_name,
+            fontSize=24,
+            textColor=colors.HexColor('#2c3e50'),
+            spaceAfter=30,
+            alignment=1  # 居中
+        ),
+        'subtitle': ParagraphStyle(
+            'CustomSubtitle',
+            parent=base['Heading2'],
+            fontName=font_name,
+            fontSize=16,
+            textColor=colors.HexColor('#7f8c8d'),
+            spaceAfter=20,
+            alignment=1
+        ),
+        'heading': ParagraphStyle(
+            'CustomHeading',
+            parent=base['Heading2'],
+            fontName=font_name,
+            fontSize=18,
+            textColor=colors.HexColor('#2c3e50'),
+            spaceAfter=12,
+            spaceBefore=20
+        ),
+        'normal': ParagraphStyle(
+            'CustomNormal',
+            parent=base['Normal'],
+            fontName=font_name,
+            fontSize=11,
+            textColor=colors.HexColor('#34495e'),
+            spaceAfter=8
+        ),
+        'rec_title': ParagraphStyle(
+            'RecTitle',
+            parent=base['Heading3'],
+            fontName=font_name,
+            fontSize=12,
+            spaceAfter=5
+        ),
+        'severity': {
+            severity: ParagraphStyle(
+                f'Severity{severity}',
+                parent=base['Heading3'],
+                fontName=font_name,
+                fontSize=14,
+                textColor=color,
+                spaceAfter=10
+            )
+            for severity, color in severity_colors.items()
+        },
+    }
+
+
+@lru_cache(maxsize=1)
+def _get_reportlab_table_styles() -> Dict[str, Any]:
+    """构建并缓存 ReportLab 表格样式"""
+    font_name = _register_font()
+    return {
+        'summary': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), font_name),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('FONTNAME', (0, 1), (-1, -1), font_name),
+            ('FONTSIZE', (0, 1), (-1, -1), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]),
+        'vuln': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
+            ('FONTNAME', (0, 0), (-1, -1), font_name),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+        ]),
+        'ports': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), font_name),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]),
+    }
+
+
+# HTML 报告骨架（用于 PDF 转换），模板只解析一次，每份报告只填充动态部分
+HTML_SHELL = Template("""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>安全评估报告 - $target</title>
+    <style>
+        $css
+    </style>
+</head>
+<body>
+    <!-- 封面页 -->
+    <div class="cover-page">
+        <div class="cover-content">
+            <h1>🔒 安全评估报告</h1>
+            <div class="subtitle">目标：$target</div>
+            <div class="meta">
+                <p>生成时间：$timestamp</p>
+                <p>评估工具：HexStrike AI (Nmap + Nuclei)</p>
+            </div>
+        </div>
+    </div>
+
+    <div class="container">
+        <!-- 报告头部 -->
+        <div class="header">
+            <h1>🔒 安全评估报告</h1>
+            <div class="subtitle">目标：$target</div>
+            <div class="meta">
+                <div>生成时间：$timestamp</div>
+                <div>评估工具：HexStrike AI (Nmap + Nuclei)</div>
+            </div>
+        </div>
+
+        <!-- 统计摘要 -->
+        <div class="summary">
+            <div class="summary-card risk-critical">
+                <div class="number">$critical</div>
+                <div class="label">严重漏洞</div>
+            </div>
+            <div class="summary-card risk-high">
+                <div class="number">$high</div>
+                <div class="label">高危漏洞</div>
+            </div>
+            <div class="summary-card risk-medium">
+                <div class="number">$medium</div>
+                <div class="label">中危漏洞</div>
+            </div>
+            <div class="summary-card risk-low">
+                <div class="number">$low</div>
+                <div class="label">低危漏洞</div>
+            </div>
+            <div class="summary-card">
+                <div class="number">$open_ports</div>
+                <div class="label">开放端口</div>
+            </div>
+        </div>
+
+        $vuln_block
+
+        $port_block
+
+        $rec_block
+
+        <!-- 报告尾部 -->
+        <div class="footer">
+            <p>本报告由 HexStrike AI 自动生成</p>
+            <p>建议：定期进行安全评估，及时修复发现的漏洞</p>
+            <p>生成时间：$timestamp</p>
+        </div>
+    </div>
+</body>
+</html>""")
+
+# 单条漏洞的 HTML 片段模板
+VULN_ITEM_HTML = '''
+                    <li class="vulnerability-item {severity}">
+                        <div class="title">
+                            <span class="severity severity-{severity}">{label}</span>
+                            {name}
+                        </div>
+                        <div style="margin-top: 10px;">
+                            {tag_html}
+                        </div>
+                        {desc_html}
+                    </li>'''
+VULN_DESC_HTML = '<div style="margin-top: 8px; color: #666;">{}...</div>'
+
+
+def _chunked_tables(data: List[List], style: Any, col_widths: List[float],
+                    chunk_size: int = TABLE_CHUNK_ROWS) -> List[Any]:
+    """将大表格按行拆分为多个小表格（每块重复表头），返回可直接追加到 story 的 flowable 列表"""
+    header, rows = data[0], data[1:]
+    flowables = []
+    for start in range(0, len(rows), chunk_size):
+        if flowables:
+            flowables.append(Spacer(1, 0.2*cm))
+        table = Table([header] + rows[start:start + chunk_size], colWidths=col_widths, repeatRows=1)
+        table.setStyle(style)
+        flowables.append(table)
+    return flowables
+
 
 class HexStrikePDFReporter:
     """HexStrike PDF 报告生成器（使用 ReportLab）"""
@@ -25,11 +338,11 @@ class HexStrikePDFReporter:
             reports_dir: 报告保存目录，默认为 BASE_DIR/reports
         """
         if reports_dir is None:
-            base_dir = Path(settings.BASE_DIR)
-            reports_dir = base_dir / 'reports'
+            reports_dir = Path(settings.BASE_DIR) / 'reports'
 
-        self.reports_dir = reports_dir
-        os.makedirs(self.reports_dir, exist_ok=True)
+        # 统一为已解析的绝对路径，后续直接用 / 拼接文件名
+        self.reports_dir = Path(reports_dir).resolve()
+        self.reports_dir.mkdir(parents=True, exist_ok=True)
 
         # 加载 PDF 样式文件
         self._load_pdf_styles()
@@ -78,87 +391,99 @@ class HexStrikePDFReporter:
         """
         # 生成文件名
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"hexstrike_report_{target.replace('.', '_').replace(':', '_')}_{timestamp}.pdf"
+        filename = f"hexstrike_report_{target.translate(FILENAME_TRANS)}_{timestamp}.pdf"
         filepath = self.reports_dir / filename
 
+        # 解析扫描结果（只解析一次，供统计/PDF/HTML 共用）
+        vuln_groups, vuln_stats = self._parse_nuclei_once(nuclei_results)
+        ports = self._parse_ports(nmap_results)
+
         # 提取统计数据
-        stats = self._extract_stats(nmap_results, nuclei_results)
+        stats = self._extract_stats(ports, vuln_stats)
         timestamp_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
+        report_data = dict(
+            target=target,
+            stats=stats,
+            nmap_results=nmap_results,
+            nuclei_results=nuclei_results,
+            vuln_groups=vuln_groups,
+            ports=ports,
+            target_profile=target_profile,
+            timestamp=timestamp_str
+        )
+
         # 方法 1: 使用 ReportLab（首选，无需系统依赖）
-        try:
-            result = self._generate_with_reportlab(
-                filepath=filepath,
-                target=target,
-                stats=stats,
-                nmap_results=nmap_results,
-                nuclei_results=nuclei_results,
-                target_profile=target_profile,
-                timestamp=timestamp_str
-            )
-            if result:
-                logger.info(f"PDF 报告生成成功 (ReportLab): {filename}")
-                return filename
-        except Exception as e:
-            logger.warning(f"ReportLab 生成失败: {e}，尝试备用方案")
+        if HAS_REPORTLAB:
+            try:
+                if self._generate_with_reportlab(filepath=filepath, **report_data):
+                    logger.info(f"PDF 报告生成成功 (ReportLab): {filename}")
+                    return filename
+            except Exception as e:
+                logger.warning(f"ReportLab 生成失败: {e}，尝试备用方案")
+        else:
+            logger.warning("ReportLab 未安装，尝试备用方案")
 
-        # 方法 2: 回退到 HTML 转 PDF（WeasyPrint）
-        try:
-            html_content = self._generate_html(
-                target=target,
-                stats=stats,
-                nmap_results=nmap_results,
-                nuclei_results=nuclei_results,
-                target_profile=target_profile,
-                timestamp=timestamp_str
-            )
-            from weasyprint import HTML, CSS
-            html_doc = HTML(string=html_content, base_url='file://')
-            css_doc = CSS(string=self.pdf_css)
-            html_doc.write_pdf(
-                target=str(filepath),
-                stylesheets=[css_doc],
-                presentational_hints=True
-            )
-            logger.info(f"PDF 报告生成成功 (WeasyPrint): {filename}")
+        # 方法 2/3: 回退到 HTML 转 PDF
+        if self._fallback_pdf(filepath, report_data):
             return filename
-        except ImportError:
+
+        # 所有方法都失败
+        logger.error("所有 PDF 生成方法都失败了")
+        logger.error("ReportLab 应该已安装，请检查")
+        return None
+
+    def _render_weasyprint(self, html_doc: Any, presentational_hints: bool = False) -> Any:
+        """使用缓存的 PDF 样式表完成 WeasyPrint 排版，返回可直接 write_pdf 的 Document"""
+        return html_doc.render(
+            stylesheets=[_get_weasyprint_css(self.pdf_css)],
+            presentational_hints=presentational_hints,
+            font_config=_get_weasyprint_font_config()
+        )
+
+    def _fallback_pdf(self, filepath: Path, report_data: Dict[str, Any]) -> bool:
+        """备用方案：HTML 转 PDF（WeasyPrint，其次 xhtml2pdf），仅在 ReportLab 失败时调用"""
+        if not HAS_WEASYPRINT and not HAS_XHTML2PDF:
+            logger.warning("WeasyPrint 和 xhtml2pdf 均未安装")
+            return False
+
+        # 方法 2: WeasyPrint
+        if HAS_WEASYPRINT:
+            try:
+                from weasyprint import HTML
+                # 样式表已通过缓存的 CSS 对象传入，HTML 中不再内联同一份样式，避免重复解析；
+                # 报告 HTML 不含 width/align 等表现属性，无需 presentational_hints
+                html_content = self._generate_html(**report_data, inline_css=False)
+                document = self._render_weasyprint(HTML(string=html_content, base_url='file://'))
+                document.write_pdf(target=str(filepath))
+                logger.info(f"PDF 报告生成成功 (WeasyPrint): {filepath.name}")
+                return True
+            except Exception as e:
+                logger.warning(f"WeasyPrint 生成失败: {e}")
+        else:
             logger.warning("WeasyPrint 未安装")
-        except Exception as e:
-            logger.warning(f"WeasyPrint 生成失败: {e}")
 
         # 方法 3: 最后回退 - xhtml2pdf
-        try:
-            if not html_content:
-                html_content = self._generate_html(
-                    target=target,
-                    stats=stats,
-                    nmap_results=nmap_results,
-                    nuclei_results=nuclei_results,
-                    target_profile=target_profile,
-                    timestamp=timestamp_str
+        if HAS_XHTML2PDF:
+            try:
+                from xhtml2pdf import pisa
+                html_content = self._generate_html(**report_data)
+                pdf_buffer = BytesIO()
+                pisa.CreatePDF(
+                    src=html_content,
+                    dest=pdf_buffer,
+                    encoding='utf-8'
                 )
-            from xhtml2pdf import pisa
-            from io import BytesIO
-            pdf_buffer = BytesIO()
-            pisa.CreatePDF(
-                src=html_content,
-                dest=pdf_buffer,
-                encoding='utf-8'
-            )
-            with open(filepath, 'wb') as f:
-                f.write(pdf_buffer.getvalue())
-            logger.info(f"PDF 报告生成成功 (xhtml2pdf): {filename}")
-            return filename
-        except ImportError:
+                with open(filepath, 'wb') as f:
+                    f.write(pdf_buffer.getvalue())
+                logger.info(f"PDF 报告生成成功 (xhtml2pdf): {filepath.name}")
+                return True
+            except Exception as e:
+                logger.warning(f"xhtml2pdf 生成失败: {e}")
+        else:
             logger.warning("xhtml2pdf 未安装")
-        except Exception as e:
-            logger.warning(f"xhtml2pdf 生成失败: {e}")
 
-        # 所有方法都失败
-        logger.error("所有 PDF 生成方法都失败了")
-        logger.error("ReportLab 应该已安装，请检查")
-        return None
+        return False
 
     def _generate_with_reportlab(
         self,
@@ -167,34 +492,23 @@ class HexStrikePDFReporter:
         stats: Dict,
         nmap_results: Optional[Dict],
         nuclei_results: Optional[Dict],
+        vuln_groups: Dict[str, List[Dict]],
+        ports: List[Dict],
         target_profile: Optional[Dict],
         timestamp: str
     ) -> bool:
         """使用 ReportLab 直接生成 PDF"""
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import cm
-        from reportlab.lib import colors
-        from reportlab.platypus import (
-            SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-        )
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-
-        # 注册中文字体（如果可用）
-        try:
-            pdfmetrics.registerFont(TTFont('ChineseFont', '/System/Library/Fonts/PingFang.ttc', subfontIndex=0))
-            font_name = 'ChineseFont'
-        except:
-            try:
-                pdfmetrics.registerFont(TTFont('ChineseFont', '/System/Library/Fonts/STHeiti Light.ttc'))
-                font_name = 'ChineseFont'
-            except:
-                font_name = 'Helvetica'  # 回退到默认字体
-
-        # 创建 PDF 文档
+        styles = _get_reportlab_styles()
+        table_styles = _get_reportlab_table_styles()
+        title_style = styles['title']
+        subtitle_style = styles['subtitle']
+        heading_style = styles['heading']
+        normal_style = styles['normal']
+
+        # 创建 PDF 文档（先渲染到内存，最后一次性写盘）
+        pdf_buffer = BytesIO()
         doc = SimpleDocTemplate(
-            str(filepath),
+            pdf_buffer,
             pagesize=A4,
             rightMargin=2*cm,
             leftMargin=2*cm,
@@ -202,44 +516,6 @@ class HexStrikePDFReporter:
             bottomMargin=2*cm
         )
 
-        # 样式
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontName=font_name,
-            fontSize=24,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=30,
-            alignment=1  # 居中
-        )
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Heading2'],
-            fontName=font_name,
-            fontSize=16,
-            textColor=colors.HexColor('#7f8c8d'),
-            spaceAfter=20,
-            alignment=1
-        )
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontName=font_name,
-            fontSize=18,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=12,
-            spaceBefore=20
-        )
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=11,
-            textColor=colors.HexColor('#34495e'),
-            spaceAfter=8
-        )
-
         # 构建内容
         story = []
 
@@ -262,63 +538,29 @@ class HexStrikePDFReporter:
             ['开放端口', str(stats['ports']['open'])],
         ]
         summary_table = Table(summary_data, colWidths=[8*cm, 4*cm])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), font_name),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('FONTNAME', (0, 1), (-1, -1), font_name),
-            ('FONTSIZE', (0, 1), (-1, -1), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        summary_table.setStyle(table_styles['summary'])
         story.append(summary_table)
         story.append(Spacer(1, 1*cm))
 
         # 漏洞详情
         if nuclei_results and nuclei_results.get('success'):
-            vulnerabilities = self._parse_vulnerabilities(nuclei_results)
-            if vulnerabilities:
+            if stats['vulnerabilities']['total']:
                 story.append(Paragraph("漏洞扫描结果", heading_style))
 
-                for severity in ['critical', 'high', 'medium', 'low', 'info']:
-                    vulns = [v for v in vulnerabilities if v['severity'] == severity]
-                    if not vulns:
+                for severity in SEVERITY_ORDER:
+                    count = stats['vulnerabilities'][severity]
+                    if not count:
                         continue
 
-                    severity_labels = {
-                        'critical': '严重',
-                        'high': '高危',
-                        'medium': '中危',
-                        'low': '低危',
-                        'info': '信息'
-                    }
-                    severity_colors = {
-                        'critical': colors.HexColor('#e74c3c'),
-                        'high': colors.HexColor('#e67e22'),
-                        'medium': colors.HexColor('#f39c12'),
-                        'low': colors.HexColor('#3498db'),
-                        'info': colors.HexColor('#95a5a6')
-                    }
-
                     story.append(Paragraph(
-                        f"{severity_labels[severity].upper()} ({len(vulns)})",
-                        ParagraphStyle(
-                            f'Severity{severity}',
-                            parent=styles['Heading3'],
-                            fontName=font_name,
-                            fontSize=14,
-                            textColor=severity_colors[severity],
-                            spaceAfter=10
-                        )
+                        f"{SEVERITY_LABELS[severity].upper()} ({count})",
+                        styles['severity'][severity]
                     ))
 
-                    for vuln in vulns[:20]:  # 最多显示 20 个
-                        name = vuln.get('name', 'Unknown')
-                        tags = ', '.join(vuln.get('tags', [])[:5])
-                        description = vuln.get('description', '')[:200]
+                    for vuln in vuln_groups[severity]:
+                        name = vuln['name']
+                        tags = ', '.join(vuln['tags'][:5])
+                        description = vuln['description'][:200]
 
                         vuln_data = [
                             ['漏洞名称', name],
@@ -328,52 +570,37 @@ class HexStrikePDFReporter:
                             vuln_data.append(['描述', f'{description}...'])
 
                         vuln_table = Table(vuln_data, colWidths=[5*cm, 10*cm])
-                        vuln_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
-                            ('FONTNAME', (0, 0), (-1, -1), font_name),
-                            ('FONTSIZE', (0, 0), (-1, -1), 10),
-                            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-                        ]))
+                        vuln_table.setStyle(table_styles['vuln'])
                         story.append(vuln_table)
                         story.append(Spacer(1, 0.3*cm))
 
-                    if len(vulns) > 20:
+                    if count > MAX_VULNS_PER_SEVERITY:
                         story.append(Paragraph(
-                            f"<i>还有 {len(vulns) - 20} 个{severity_labels[severity]}漏洞未显示</i>",
+                            f"<i>还有 {count - MAX_VULNS_PER_SEVERITY} 个{SEVERITY_LABELS[severity]}漏洞未显示</i>",
                             normal_style
                         ))
                         story.append(Spacer(1, 0.5*cm))
 
         # 端口详情
         if nmap_results and nmap_results.get('success'):
-            ports = self._parse_ports(nmap_results)
             if ports:
                 story.append(Paragraph("端口扫描结果", heading_style))
 
+                assess = self._assess_port_risk
                 port_data = [['端口/协议', '服务', '版本', '风险等级']]
-                for port_info in ports:
-                    risk = self._assess_port_risk(port_info['port'], port_info['service'])
-                    risk_label = risk['label'] if risk else '-'
-                    port_data.append([
-                        f"{port_info['port']}/tcp",
-                        port_info['service'],
-                        port_info['version'] or '-',
-                        risk_label
-                    ])
-
-                port_table = Table(port_data, colWidths=[3*cm, 4*cm, 5*cm, 3*cm])
-                port_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, -1), font_name),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                story.append(port_table)
+                port_data.extend(
+                    [
+                        f"{p['port']}/tcp",
+                        p['service'],
+                        p['version'] or '-',
+                        assess(p['port'], p['service'])[1]
+                    ]
+                    for p in ports
+                )
+
+                story.extend(_chunked_tables(
+                    port_data, table_styles['ports'], [3*cm, 4*cm, 5*cm, 3*cm]
+                ))
                 story.append(Spacer(1, 1*cm))
 
         # 安全建议
@@ -381,13 +608,7 @@ class HexStrikePDFReporter:
         if recommendations:
             story.append(Paragraph("安全建议", heading_style))
             for rec in recommendations:
-                story.append(Paragraph(rec['title'], ParagraphStyle(
-                    'RecTitle',
-                    parent=styles['Heading3'],
-                    fontName=font_name,
-                    fontSize=12,
-                    spaceAfter=5
-                )))
+                story.append(Paragraph(rec['title'], styles['rec_title']))
                 for item in rec['items']:
                     story.append(Paragraph(f"• {item}", normal_style))
                 story.append(Spacer(1, 0.5*cm))
@@ -402,45 +623,76 @@ class HexStrikePDFReporter:
 
         # 生成 PDF
         doc.build(story)
+        with open(filepath, 'wb', buffering=PDF_WRITE_BUFFER_SIZE) as f:
+            f.write(pdf_buffer.getbuffer())
         return True
 
-    def _parse_vulnerabilities(self, nuclei_results: Dict) -> List[Dict]:
-        """解析漏洞列表"""
+    def _iter_vulnerabilities(self, nuclei_results: Optional[Dict]) -> Iterator[Dict]:
+        """逐条解析 Nuclei JSONL 输出（生成器，不整体物化漏洞列表）"""
+        if not nuclei_results or not nuclei_results.get('success'):
+            return
+
+        stdout = nuclei_results.get('stdout', '')
+        if not stdout:
+            return
+
+        # 以 bytes 切分，orjson 可直接解析 bytes，省去逐行 str 解码；
+        # 空行和非 JSON 对象行直接跳过，不走异常路径
+        for line in stdout.encode('utf-8').splitlines():
+            line = line.strip()
+            if not line.startswith(b'{'):
+                continue
+            try:
+                vuln = json_loads(line)
+                info = vuln.get('info', {})
+                severity = info.get('severity', 'info').lower()
+            except json.JSONDecodeError:
+                continue
+            except (AttributeError, TypeError) as e:
+                # 单条记录结构异常只跳过该条，不影响其余漏洞的统计
+                logger.debug(f"跳过格式异常的 Nuclei 记录: {e}")
+                continue
+            yield {
+                'name': info.get('name', 'Unknown'),
+                'severity': severity if severity in SEVERITY_LABELS else 'info',
+                'tags': info.get('tags', []),
+                'description': info.get('description', '')
+            }
+
+    def _parse_nuclei_once(self, nuclei_results: Optional[Dict]) -> Tuple[Dict[str, List[Dict]], Dict[str, int]]:
+        """
+        解析 Nuclei 结果，在同一次遍历中完成分组与计数（每份报告只解析一次）
+
+        Returns:
+            (groups, vuln_stats)：groups 为 {severity: 前 MAX_VULNS_PER_SEVERITY 条漏洞}，
+            内存占用与漏洞总数无关；vuln_stats 为各严重性及 total 的计数
+        """
+        groups = {severity: [] for severity in SEVERITY_ORDER}
+        vuln_stats = dict.fromkeys(SEVERITY_ORDER, 0)
+        vuln_stats['total'] = 0
         try:
-            import json
-            stdout = nuclei_results.get('stdout', '')
-            if not stdout:
-                return []
+            for vuln in self._iter_vulnerabilities(nuclei_results):
+                severity = vuln['severity']
+                vuln_stats[severity] += 1
+                vuln_stats['total'] += 1
+                if vuln_stats[severity] <= MAX_VULNS_PER_SEVERITY:
+                    groups[severity].append(vuln)
+        except Exception as e:
+            logger.warning(f"解析 Nuclei 结果失败，漏洞统计可能不完整: {e}")
+        return groups, vuln_stats
 
-            vulnerabilities = []
-            lines = stdout.strip().split('\n')
-            for line in lines:
-                try:
-                    vuln = json.loads(line)
-                    info = vuln.get('info', {})
-                    vulnerabilities.append({
-                        'name': info.get('name', 'Unknown'),
-                        'severity': info.get('severity', 'info').lower(),
-                        'tags': info.get('tags', []),
-                        'description': info.get('description', '')
-                    })
-                except json.JSONDecodeError:
-                    pass
-            return vulnerabilities
-        except Exception:
+    def _parse_ports(self, nmap_results: Optional[Dict]) -> List[Dict]:
+        """解析开放端口列表（每份报告只解析一次）"""
+        if not nmap_results or not nmap_results.get('success'):
             return []
 
-    def _parse_ports(self, nmap_results: Dict) -> List[Dict]:
-        """解析端口列表"""
         try:
-            import re
             stdout = nmap_results.get('stdout', '')
             if not stdout:
                 return []
 
             ports = []
-            port_pattern = re.compile(r'(\d+)/tcp\s+open\s+(\S+)(?:\s+(.+))?')
-            for match in port_pattern.finditer(stdout):
+            for match in PORT_RE.finditer(stdout):
                 ports.append({
                     'port': match.group(1),
                     'service': match.group(2),
@@ -455,9 +707,9 @@ class HexStrikePDFReporter:
         recommendations = []
 
         if nmap_results and nmap_results.get('success'):
-            stdout = nmap_results.get('stdout', '')
+            hits = scan_keywords(NMAP_TRIGGERS_RE, nmap_results.get('stdout', ''), 3)
 
-            if 'ssh' in stdout.lower():
+            if 'ssh' in hits:
                 recommendations.append({
                     'title': 'SSH 安全加固',
                     'items': [
@@ -468,7 +720,7 @@ class HexStrikePDFReporter:
                     ]
                 })
 
-            if 'elasticsearch' in stdout.lower() or ':9200' in stdout:
+            if 'elasticsearch' in hits or ':9200' in hits:
                 recommendations.append({
                     'title': 'Elasticsearch 安全加固',
                     'items': [
@@ -481,8 +733,7 @@ class HexStrikePDFReporter:
 
         if nuclei_results and nuclei_results.get('success'):
             try:
-                stdout = nuclei_results.get('stdout', '')
-                if 'critical' in stdout.lower() or 'high' in stdout.lower():
+                if scan_keywords(NUCLEI_TRIGGERS_RE, nuclei_results.get('stdout', ''), 1):
                     recommendations.append({
                         'title': '漏洞修复优先级',
                         'items': [
@@ -503,236 +754,102 @@ class HexStrikePDFReporter:
         stats: Dict,
         nmap_results: Optional[Dict],
         nuclei_results: Optional[Dict],
+        vuln_groups: Dict[str, List[Dict]],
+        ports: List[Dict],
         target_profile: Optional[Dict],
-        timestamp: str
+        timestamp: str,
+        inline_css: bool = True
     ) -> str:
-        """生成 HTML 内容（用于 PDF 转换）"""
-
-        html = f"""<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>安全评估报告 - {target}</title>
-    <style>
-        {self.pdf_css}
-    </style>
-</head>
-<body>
-    <!-- 封面页 -->
-    <div class="cover-page">
-        <div class="cover-content">
-            <h1>🔒 安全评估报告</h1>
-            <div class="subtitle">目标：{target}</div>
-            <div class="meta">
-                <p>生成时间：{timestamp}</p>
-                <p>评估工具：HexStrike AI (Nmap + Nuclei)</p>
-            </div>
-        </div>
-    </div>
-
-    <div class="container">
-        <!-- 报告头部 -->
-        <div class="header">
-            <h1>🔒 安全评估报告</h1>
-            <div class="subtitle">目标：{target}</div>
-            <div class="meta">
-                <div>生成时间：{timestamp}</div>
-                <div>评估工具：HexStrike AI (Nmap + Nuclei)</div>
-            </div>
-        </div>
-
-        <!-- 统计摘要 -->
-        <div class="summary">
-            <div class="summary-card risk-critical">
-                <div class="number">{stats['vulnerabilities']['critical']}</div>
-                <div class="label">严重漏洞</div>
-            </div>
-            <div class="summary-card risk-high">
-                <div class="number">{stats['vulnerabilities']['high']}</div>
-                <div class="label">高危漏洞</div>
-            </div>
-            <div class="summary-card risk-medium">
-                <div class="number">{stats['vulnerabilities']['medium']}</div>
-                <div class="label">中危漏洞</div>
-            </div>
-            <div class="summary-card risk-low">
-                <div class="number">{stats['vulnerabilities']['low']}</div>
-                <div class="label">低危漏洞</div>
-            </div>
-            <div class="summary-card">
-                <div class="number">{stats['ports']['open']}</div>
-                <div class="label">开放端口</div>
-            </div>
-        </div>
-
-        {self._generate_vulnerabilities_html(nuclei_results)}
-
-        {self._generate_ports_html(nmap_results)}
-
-        {self._generate_recommendations_html(nmap_results, nuclei_results)}
-
-        <!-- 报告尾部 -->
-        <div class="footer">
-            <p>本报告由 HexStrike AI 自动生成</p>
-            <p>建议：定期进行安全评估，及时修复发现的漏洞</p>
-            <p>生成时间：{timestamp}</p>
-        </div>
-    </div>
-</body>
-</html>"""
-        return html
+        """生成 HTML 内容（用于 PDF 转换），inline_css=False 时不内联 PDF 样式"""
+        return HTML_SHELL.substitute(
+            target=escape(target),
+            css=self.pdf_css if inline_css else '',
+            timestamp=timestamp,
+            critical=stats['vulnerabilities']['critical'],
+            high=stats['vulnerabilities']['high'],
+            medium=stats['vulnerabilities']['medium'],
+            low=stats['vulnerabilities']['low'],
+            open_ports=stats['ports']['open'],
+            vuln_block=self._generate_vulnerabilities_html(nuclei_results, vuln_groups, stats['vulnerabilities']),
+            port_block=self._generate_ports_html(nmap_results, ports),
+            rec_block=self._generate_recommendations_html(nmap_results, nuclei_results),
+        )
 
-    def _extract_stats(self, nmap_results: Optional[Dict], nuclei_results: Optional[Dict]) -> Dict:
-        """提取统计数据"""
+    def _extract_stats(self, ports: List[Dict], vuln_stats: Dict[str, int]) -> Dict:
+        """提取统计数据（漏洞计数已在解析时完成）"""
         stats = {
-            'vulnerabilities': {'critical': 0, 'high': 0, 'medium': 0, 'low': 0, 'info': 0, 'total': 0},
+            'vulnerabilities': vuln_stats,
             'ports': {'open': 0, 'closed': 0, 'filtered': 0, 'total': 0}
         }
 
-        # 提取漏洞统计
-        if nuclei_results and nuclei_results.get('success'):
-            try:
-                import json
-                stdout = nuclei_results.get('stdout', '')
-                if stdout:
-                    lines = stdout.strip().split('\n')
-                    for line in lines:
-                        try:
-                            vuln = json.loads(line)
-                            severity = vuln.get('info', {}).get('severity', 'info').lower()
-                            if severity in stats['vulnerabilities']:
-                                stats['vulnerabilities'][severity] += 1
-                                stats['vulnerabilities']['total'] += 1
-                        except json.JSONDecodeError:
-                            pass
-            except Exception:
-                pass
-
         # 提取端口统计
-        if nmap_results and nmap_results.get('success'):
-            try:
-                import re
-                stdout = nmap_results.get('stdout', '')
-                if stdout:
-                    port_matches = re.findall(r'(\d+)/tcp\s+open', stdout)
-                    stats['ports']['open'] = len(port_matches)
-                    stats['ports']['total'] = len(port_matches)
-            except Exception:
-                pass
+        stats['ports']['open'] = len(ports)
+        stats['ports']['total'] = len(ports)
 
         return stats
 
-    def _generate_vulnerabilities_html(self, nuclei_results: Optional[Dict]) -> str:
+    def _generate_vulnerabilities_html(
+        self,
+        nuclei_results: Optional[Dict],
+        vuln_groups: Dict[str, List[Dict]],
+        vuln_stats: Dict[str, int]
+    ) -> str:
         """生成漏洞列表 HTML"""
         if not nuclei_results or not nuclei_results.get('success'):
             return ''
 
         try:
-            import json
-            stdout = nuclei_results.get('stdout', '')
-            if not stdout:
+            if not nuclei_results.get('stdout', ''):
                 return ''
 
-            # 解析漏洞
-            vulnerabilities = []
-            lines = stdout.strip().split('\n')
-            for line in lines:
-                try:
-                    vuln = json.loads(line)
-                    vulnerabilities.append(vuln)
-                except json.JSONDecodeError:
-                    pass
-
-            if not vulnerabilities:
+            if not vuln_stats['total']:
                 return '<div class="section"><h2 class="section-title">🎉 未发现漏洞</h2><p>扫描完成，未发现已知漏洞。</p></div>'
 
-            # 按严重性分组
-            by_severity = {'critical': [], 'high': [], 'medium': [], 'low': [], 'info': []}
-            for vuln in vulnerabilities:
-                severity = vuln.get('info', {}).get('severity', 'info').lower()
-                if severity not in by_severity:
-                    severity = 'info'
-                by_severity[severity].append(vuln)
+            parts = ['<div class="section"><h2 class="section-title">🔍 漏洞扫描结果</h2>']
 
-            html = '<div class="section"><h2 class="section-title">🔍 漏洞扫描结果</h2>'
-
-            for severity in ['critical', 'high', 'medium', 'low', 'info']:
-                vulns = by_severity.get(severity, [])
-                if not vulns:
+            for severity in SEVERITY_ORDER:
+                count = vuln_stats[severity]
+                if not count:
                     continue
 
-                severity_labels = {
-                    'critical': '严重',
-                    'high': '高危',
-                    'medium': '中危',
-                    'low': '低危',
-                    'info': '信息'
-                }
+                label = SEVERITY_LABELS[severity]
+                parts.append(f'<h3>{label.upper()} ({count})</h3>')
+                parts.append('<ul class="vulnerability-list">')
 
-                html += f'<h3>{severity_labels[severity].upper()} ({len(vulns)})</h3>'
-                html += '<ul class="vulnerability-list">'
+                for vuln in vuln_groups[severity]:
+                    description = vuln['description'][:200]
+                    parts.append(VULN_ITEM_HTML.format_map({
+                        'severity': severity,
+                        'label': label,
+                        'name': escape(vuln['name']),
+                        'tag_html': ' '.join(f'<span class="tag">{escape(tag)}</span>' for tag in vuln['tags'][:5]),
+                        'desc_html': VULN_DESC_HTML.format(escape(description)) if description else '',
+                    }))
 
-                for vuln in vulns[:20]:  # 最多显示 20 个
-                    info = vuln.get('info', {})
-                    name = info.get('name', 'Unknown')
-                    cve_ids = info.get('tags', [])
-                    description = info.get('description', '')[:200]
+                if count > MAX_VULNS_PER_SEVERITY:
+                    parts.append(f'<li style="padding: 10px; color: #999;">还有 {count - MAX_VULNS_PER_SEVERITY} 个{label}漏洞未显示</li>')
 
-                    html += f'''
-                    <li class="vulnerability-item {severity}">
-                        <div class="title">
-                            <span class="severity severity-{severity}">{severity_labels[severity]}</span>
-                            {name}
-                        </div>
-                        <div style="margin-top: 10px;">
-                            {' '.join([f'<span class="tag">{tag}</span>' for tag in cve_ids[:5]])}
-                        </div>
-                        {f'<div style="margin-top: 8px; color: #666;">{description}...</div>' if description else ''}
-                    </li>'''
-
-                if len(vulns) > 20:
-                    html += f'<li style="padding: 10px; color: #999;">还有 {len(vulns) - 20} 个{severity_labels[severity]}漏洞未显示</li>'
+                parts.append('</ul>')
 
-                html += '</ul>'
-
-            html += '</div>'
-            return html
+            parts.append('</div>')
+            return ''.join(parts)
 
         except Exception as e:
-            return f'<div class="section"><h2 class="section-title">漏洞扫描结果</h2><p>解析失败: {str(e)}</p></div>'
+            return f'<div class="section"><h2 class="section-title">漏洞扫描结果</h2><p>解析失败: {escape(str(e))}</p></div>'
 
-    def _generate_ports_html(self, nmap_results: Optional[Dict]) -> str:
+    def _generate_ports_html(self, nmap_results: Optional[Dict], ports: List[Dict]) -> str:
         """生成端口列表 HTML"""
         if not nmap_results or not nmap_results.get('success'):
             return ''
 
         try:
-            import re
-            stdout = nmap_results.get('stdout', '')
-            if not stdout:
+            if not nmap_results.get('stdout', ''):
                 return ''
 
-            # 解析端口信息
-            port_pattern = re.compile(r'(\d+)/tcp\s+open\s+(\S+)(?:\s+(.+))?')
-
-            ports = []
-            for match in port_pattern.finditer(stdout):
-                port = match.group(1)
-                service = match.group(2)
-                version = match.group(3) or ''
-
-                ports.append({
-                    'port': port,
-                    'service': service,
-                    'version': version
-                })
-
             if not ports:
                 return '<div class="section"><h2 class="section-title">端口扫描结果</h2><p>未发现开放端口。</p></div>'
 
-            html = '<div class="section"><h2 class="section-title">🔌 端口扫描结果</h2>'
-            html += '<div class="port-list">'
+            parts = ['<div class="section"><h2 class="section-title">🔌 端口扫描结果</h2>', '<div class="port-list">']
 
             for port_info in ports:
                 port = port_info['port']
@@ -740,23 +857,23 @@ class HexStrikePDFReporter:
                 version = port_info['version']
 
                 # 风险评估
-                risk = self._assess_port_risk(port, service)
+                risk_level, risk_label = self._assess_port_risk(port, service)
 
-                html += f'''
+                parts.append(f'''
                 <div class="port-item open">
                     <div class="port-number">端口 {port}/tcp</div>
                     <div class="service">
-                        服务：{service}
-                        {f'<span class="risk-badge risk-{risk["level"]}">{risk["label"]}</span>' if risk else ''}
+                        服务：{escape(service)}
+                        <span class="risk-badge risk-{risk_level}">{risk_label}</span>
                     </div>
-                    {f'<div style="font-size: 12px; color: #999; margin-top: 5px;">{version}</div>' if version else ''}
-                </div>'''
+                    {f'<div style="font-size: 12px; color: #999; margin-top: 5px;">{escape(version)}</div>' if version else ''}
+                </div>''')
 
-            html += '</div></div>'
-            return html
+            parts.append('</div></div>')
+            return ''.join(parts)
 
         except Exception as e:
-            return f'<div class="section"><h2 class="section-title">端口扫描结果</h2><p>解析失败: {str(e)}</p></div>'
+            return f'<div class="section"><h2 class="section-title">端口扫描结果</h2><p>解析失败: {escape(str(e))}</p></div>'
 
     def _generate_recommendations_html(self, nmap_results: Optional[Dict], nuclei_results: Optional[Dict]) -> str:
         """生成修复建议 HTML"""
@@ -764,9 +881,9 @@ class HexStrikePDFReporter:
 
         # 基于 Nmap 结果的建议
         if nmap_results and nmap_results.get('success'):
-            stdout = nmap_results.get('stdout', '')
+            hits = scan_keywords(NMAP_TRIGGERS_RE, nmap_results.get('stdout', ''), 3)
 
-            if 'ssh' in stdout.lower():
+            if 'ssh' in hits:
                 recommendations.append({
                     'title': '🔐 SSH 安全加固',
                     'items': [
@@ -777,7 +894,7 @@ class HexStrikePDFReporter:
                     ]
                 })
 
-            if 'elasticsearch' in stdout.lower() or ':9200' in stdout:
+            if 'elasticsearch' in hits or ':9200' in hits:
                 recommendations.append({
                     'title': '🔍 Elasticsearch 安全加固',
                     'items': [
@@ -791,8 +908,7 @@ class HexStrikePDFReporter:
         # 基于 Nuclei 结果的建议
         if nuclei_results and nuclei_results.get('success'):
             try:
-                stdout = nuclei_results.get('stdout', '')
-                if 'critical' in stdout.lower() or 'high' in stdout.lower():
+                if scan_keywords(NUCLEI_TRIGGERS_RE, nuclei_results.get('stdout', ''), 1):
                     recommendations.append({
                         'title': '🚨 漏洞修复优先级',
                         'items': [
@@ -808,32 +924,30 @@ class HexStrikePDFReporter:
         if not recommendations:
             return ''
 
-        html = '<div class="section"><h2 class="section-title">💡 安全建议</h2>'
+        parts = ['<div class="section"><h2 class="section-title">💡 安全建议</h2>']
 
         for rec in recommendations:
-            html += f'''
+            parts.append(f'''
             <div class="recommendations">
                 <h3 style="margin-bottom: 10px;">{rec['title']}</h3>
                 <ul>
-                    {''.join([f'<li>{item}</li>' for item in rec['items']])}
+                    {''.join(f'<li>{item}</li>' for item in rec['items'])}
                 </ul>
             </div>
-            '''
+            ''')
 
-        html += '</div>'
-        return html
+        parts.append('</div>')
+        return ''.join(parts)
 
-    def _assess_port_risk(self, port: str, service: str) -> Optional[Dict]:
-        """评估端口风险"""
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _assess_port_risk(port: str, service: str) -> Tuple[str, str]:
+        """评估端口风险，返回 (level, label)"""
         port_num = int(port) if port.isdigit() else 0
-        service_lower = service.lower()
-
-        critical_ports = [22, 23, 135, 139, 445, 3389]
-        critical_services = ['telnet', 'ftp', 'rsh', 'rlogin']
 
-        if port_num in critical_ports or service_lower in critical_services:
-            return {'level': 'critical', 'label': '严重'}
+        if port_num in CRITICAL_PORTS or service.lower() in CRITICAL_SERVICES:
+            return ('critical', '严重')
         elif port_num < 1024:
-            return {'level': 'medium', 'label': '中危'}
+            return ('medium', '中危')
         else:
-            return {'level': 'low', 'label': '低危'}
\ No newline at end of file
+            return ('low', '低危')
\ No newline at end of file
@@ -3,6 +3,8 @@ HexStrike 扫描报告 ZIP 打包服务
 将 HTML 和 PDF 报告打包成 ZIP 文件
 """
 import os
+import uuid
+from io import BytesIO
 import zipfile
 import logging
 from typing import List, Optional
@@ -10,6 +12,28 @@ from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+# PDF 内部流已是 Flate 压缩，再次 DEFLATE 几乎不减小体积，直接存储
+STORED_EXTENSIONS = ('.pdf', '.zip', '.png', '.jpg', '.jpeg')
+# HTML 等文本使用最快压缩级别：体积相近，压缩耗时明显更低
+ZIP_COMPRESS_LEVEL = 1
+
+
+def _compress_type_for(filename: str) -> int:
+    """根据文件类型选择 ZIP 压缩方式"""
+    if filename.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _open_zip(file) -> zipfile.ZipFile:
+    """
+    以写模式打开报告 ZIP（统一压缩方式与级别）
+
+    DEFLATE 仍使用标准库 zlib：isal/libdeflate 只能通过进程级替换 zlib 模块接入，
+    会影响同进程内所有 zlib 使用方；PDF 已改为直接存储，剩余只需压缩体积较小的 HTML。
+    """
+    return zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED, compresslevel=ZIP_COMPRESS_LEVEL)
+
 
 class HexStrikeZipReporter:
     """HexStrike 报告 ZIP 打包服务"""
@@ -58,8 +82,9 @@ class HexStrikeZipReporter:
 
             logger.info(f"开始创建 ZIP 报告: {zip_filename}")
 
-            # 创建 ZIP 文件
-            with zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            # 先在内存中构建 ZIP，完成后一次性写盘，避免压缩与小块写交替进行
+            buffer = BytesIO()
+            with _open_zip(buffer) as zipf:
                 for report_file in report_files:
                     # 完整文件路径
                     full_path = os.path.join(self.reports_dir, report_file)
@@ -71,9 +96,22 @@ class HexStrikeZipReporter:
 
                     # 添加到 ZIP，使用简化的文件名
                     arcname = report_file  # 使用相对路径
-                    zipf.write(full_path, arcname)
+                    # 压缩级别取自 ZipFile 的 compresslevel；超过 ZIP64 阈值时 write() 会自动启用 ZIP64
+                    zipf.write(full_path, arcname, compress_type=_compress_type_for(arcname))
                     logger.info(f"已添加到 ZIP: {report_file}")
 
+            # 写入临时文件后原子替换，读取方不会看到写了一半的 ZIP
+            # 临时文件名带随机后缀：同一进程内多个线程生成同名报告时互不覆盖
+            tmp_path = f"{zip_file_path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(buffer.getbuffer())
+                os.replace(tmp_path, zip_file_path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
             logger.info(f"ZIP 报告创建成功: {zip_filename}")
             return zip_filename
 
@@ -0,0 +1,32 @@
+"""
+意图分析目标提取规则
+SecOpsAgent 与 SecOpsConversationService 共用，保证两处识别 IP/域名目标的方式一致
+"""
+import re
+import logging
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# IPv4（不用 \b，避免 IP 紧邻中文时匹配失败）
+IPV4_RE = re.compile(r'(?:\d{1,3}\.){3}\d{1,3}')
+DOMAIN_RE = re.compile(r'(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}')
+# 简单主机名：连续字母数字与点、横线
+HOST_RE = re.compile(r'([a-zA-Z0-9][a-zA-Z0-9.-]{2,50})')
+# IPv4 与域名合并为一个模式：回溯对话历史时每条消息只需扫描一遍
+TARGET_RE = re.compile(r'(?P<ip>%s)|(?P<domain>%s)' % (IPV4_RE.pattern, DOMAIN_RE.pattern))
+
+
+def find_history_target(conversation_history: Optional[List[Dict]]) -> Optional[str]:
+    """倒序查找对话历史中最近的 IP/域名（重新扫描时使用），找不到返回 None"""
+    for msg in reversed(conversation_history or []):
+        content = msg.get('content', '')
+        match = TARGET_RE.search(content)
+        if match:
+            # 同一条消息中优先取 IPv4：最左命中是域名时，再从该位置起查找 IPv4
+            if match.lastgroup == 'domain':
+                match = IPV4_RE.search(content, match.start()) or match
+            target = match.group(0).strip()
+            logger.info("意图分析：从对话历史中提取到重新扫描目标，target=%s", target)
+            return target
+    return None
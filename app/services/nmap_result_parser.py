@@ -8,10 +8,30 @@ Nmap 扫描结果解析和格式化工具
 4. 生成安全评估和建议
 """
 
+import io
+import json
 import re
-import xml.etree.ElementTree as ET
-from typing import Dict, List, Any, Optional
+from operator import itemgetter
+from typing import Dict, List, Any, Optional, BinaryIO
 from collections import defaultdict
+from itertools import groupby
+
+# lxml（libxml2）解析大体积 XML 明显快于标准库，未安装时回退到 ElementTree
+try:
+    from lxml import etree as ET
+    HAS_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    HAS_LXML = False
+
+# orjson 解析大体积 JSON 明显快于标准库；其 JSONDecodeError 继承自 json.JSONDecodeError
+try:
+    import orjson
+    json_loads = orjson.loads
+    HAS_ORJSON = True
+except ImportError:
+    json_loads = json.loads
+    HAS_ORJSON = False
 
 
 class NmapResultParser:
@@ -37,6 +57,37 @@ class NmapResultParser:
         'info': {'emoji': '🔵', 'label': '信息', 'min_score': 0}
     }
 
+    # 端口风险评估：高危/中危端口集合与端口 -> 风险等级映射（类加载时构建一次）
+    _CRITICAL_PORTS = frozenset({22, 23, 135, 139, 445, 3389, 5900})
+    _CRITICAL_SERVICES = frozenset({'telnet', 'ftp', 'rsh', 'rlogin', 'smtp'})
+    _MEDIUM_PORTS = frozenset({21, 25, 53, 110, 143, 3306, 5432, 6379, 27017})
+    _RISK_CRITICAL = "🔴 **严重** - 未加密的敏感服务"
+    _RISK_HIGH = "🟠 **高危** - 可能存在已知漏洞"
+    _RISK_SYSTEM = "🟡 **中危** - 系统端口，需关注"
+    _RISK_APP = "🟢 **低危** - 应用端口"
+    _PORT_RISK = {
+        **dict.fromkeys(_MEDIUM_PORTS, _RISK_HIGH),
+        **dict.fromkeys(_CRITICAL_PORTS, _RISK_CRITICAL),
+    }
+    # 明文传输协议
+    _PLAINTEXT_PORTS = frozenset({21, 23})
+    _PLAINTEXT_SERVICES = frozenset({'telnet', 'ftp'})
+    # 端口详情中展示的状态及其顺序
+    _STATE_ORDER = {'open': 0, 'open|filtered': 1, 'filtered': 2, 'closed': 3}
+    # 加固建议对应的端口集合
+    _WEB_PORTS = frozenset({80, 443, 8080, 8443})
+    _DB_PORTS = frozenset({3306, 5432, 27017})
+    # XML service 元素中提取的属性
+    _SERVICE_ATTRS = ('name', 'product', 'version', 'extrainfo', 'fingerprint')
+
+    # 文本输出解析正则（类加载时编译一次，按行锚定后对整段输出 finditer）
+    _PORT_RE = re.compile(
+        r'^[ \t]*(\d+)/(tcp|udp)[ \t]+(\S+)[ \t]+(\S+)(?:[ \t]+(.+?))?[ \t\r]*$',
+        re.MULTILINE
+    )
+    _IPV4_RE = re.compile(r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})')
+    _TARGET_LINE_RE = re.compile(r'^.*(?:Starting Nmap|scan initiated).*$', re.MULTILINE)
+
     def __init__(self):
         self.target = None
         self.ports = []
@@ -55,24 +106,34 @@ class NmapResultParser:
         Returns:
             解析后的结果字典
         """
-        self.ports = []
-        self.os_guesses = []
-        self.hostnames = []
-        self.stats = defaultdict(int)
+        self._reset()
+
+        # 只看开头一小段判断格式，避免对整份输出做子串扫描或 strip() 复制
+        head = stdout[:64].lstrip() if stdout else ''
 
         # 尝试解析 XML 格式
-        if stdout and '<?xml' in stdout:
+        if head.startswith(('<?xml', '<nmaprun')):
             self._parse_xml_output(stdout)
         # 尝试解析 JSON 格式
-        elif stdout and stdout.strip().startswith('{'):
+        elif head.startswith('{'):
             self._parse_json_output(stdout)
         # 解析文本格式（备用方案）
         elif stdout:
             self._parse_text_output(stdout)
 
-        # 生成统计信息
-        self._calculate_stats()
+        return self._build_result()
 
+    def _reset(self) -> None:
+        """重置解析状态"""
+        self.ports = []
+        self.os_guesses = []
+        self.hostnames = []
+        self.stats = defaultdict(int)
+        # 状态统计在各解析分支中随端口一并累加，无需再遍历一遍端口列表
+        self.stats['open_ports'] = 0
+
+    def _build_result(self) -> Dict[str, Any]:
+        """组装解析结果"""
         return {
             'target': self.target,
             'ports': self.ports,
@@ -82,73 +143,89 @@ class NmapResultParser:
             'total_ports': len(self.ports)
         }
 
+    def _parse_xml_stream(self, fp: BinaryIO) -> None:
+        """增量解析 XML 流，只处理第一个 host（解析失败抛出 ET.ParseError）"""
+        if HAS_LXML:
+            context = ET.iterparse(fp, events=('end',), tag='host')
+        else:
+            context = ET.iterparse(fp, events=('end',))
+
+        for _, elem in context:
+            if elem.tag != 'host':
+                continue
+            self._parse_xml_host(elem)
+            # 与原先 root.find('.//host') 一致只取第一个主机，后续内容无需再解析
+            elem.clear()
+            break
+
     def _parse_xml_output(self, output: str) -> None:
         """解析 XML 格式输出"""
         try:
-            root = ET.fromstring(output)
-
-            # 获取目标地址
-            host = root.find('.//host')
-            if host is not None:
-                address_elem = host.find('.//address[@addrtype="ipv4"]')
-                if address_elem is not None:
-                    self.target = address_elem.get('addr')
-
-                # 获取主机名
-                hostnames_elem = host.find('.//hostnames')
-                if hostnames_elem is not None:
-                    for hostname in hostnames_elem.findall('hostname'):
-                        self.hostnames.append({
-                            'name': hostname.get('name'),
-                            'type': hostname.get('type')
-                        })
-
-                # 获取端口信息
-                ports_elem = host.find('.//ports')
-                if ports_elem is not None:
-                    for port in ports_elem.findall('port'):
-                        port_id = port.get('portid')
-                        protocol = port.get('protocol')
-                        state_elem = port.find('state')
-                        state = state_elem.get('state') if state_elem is not None else 'unknown'
-
-                        service_elem = port.find('service')
-                        service_info = {}
-                        if service_elem is not None:
-                            service_info = {
-                                'name': service_elem.get('name', ''),
-                                'product': service_elem.get('product', ''),
-                                'version': service_info.get('version', ''),
-                                'extrainfo': service_elem.get('extrainfo', ''),
-                                'fingerprint': service_elem.get('fingerprint', '')
-                            }
-
-                        self.ports.append({
-                            'port': port_id,
-                            'protocol': protocol,
-                            'state': state,
-                            'service': service_info
-                        })
-
-                # 获取操作系统猜测
-                os_elem = host.find('.//os')
-                if os_elem is not None:
-                    for osmatch in os_elem.findall('osmatch'):
-                        self.os_guesses.append({
-                            'name': osmatch.get('name'),
-                            'accuracy': osmatch.get('accuracy')
-                        })
-
+            self._parse_xml_stream(io.BytesIO(output.encode('utf-8')))
         except ET.ParseError as e:
             print(f"XML 解析错误: {str(e)}")
             # 回退到文本解析
             self._parse_text_output(output)
 
+    def _parse_xml_host(self, host) -> None:
+        """解析单个 host 元素"""
+        # 获取目标地址
+        address_elem = host.find('.//address[@addrtype="ipv4"]')
+        if address_elem is not None:
+            self.target = address_elem.get('addr')
+
+        # 获取主机名
+        hostnames_elem = host.find('.//hostnames')
+        if hostnames_elem is not None:
+            for hostname in hostnames_elem.findall('hostname'):
+                self.hostnames.append({
+                    'name': hostname.get('name'),
+                    'type': hostname.get('type')
+                })
+
+        # 获取端口信息
+        ports_elem = host.find('.//ports')
+        if ports_elem is not None:
+            stats = self.stats
+            service_attrs = self._SERVICE_ATTRS
+            for port in ports_elem.findall('port'):
+                port_attrs = port.attrib
+                port_id = port_attrs.get('portid')
+                protocol = port_attrs.get('protocol')
+                state_elem = port.find('state')
+                state = state_elem.get('state') if state_elem is not None else 'unknown'
+                stats[state] += 1
+                stats['total'] += 1
+                if state == 'open':
+                    stats['open_ports'] += 1
+
+                service_elem = port.find('service')
+                service_info = {}
+                if service_elem is not None:
+                    attrs = service_elem.attrib
+                    service_info = {k: attrs.get(k, '') for k in service_attrs}
+
+                self.ports.append({
+                    'port': port_id,
+                    'port_num': self._to_port_num(port_id),
+                    'protocol': protocol,
+                    'state': state,
+                    'service': service_info
+                })
+
+        # 获取操作系统猜测
+        os_elem = host.find('.//os')
+        if os_elem is not None:
+            for osmatch in os_elem.findall('osmatch'):
+                self.os_guesses.append({
+                    'name': osmatch.get('name'),
+                    'accuracy': osmatch.get('accuracy')
+                })
+
     def _parse_json_output(self, output: str) -> None:
         """解析 JSON 格式输出"""
         try:
-            import json
-            data = json.loads(output)
+            data = json_loads(output)
 
             # 提取目标
             if isinstance(data, dict):
@@ -156,11 +233,20 @@ class NmapResultParser:
 
                 # 提取端口
                 ports_data = data.get('ports', [])
+                stats = self.stats
                 for port_info in ports_data:
+                    state = port_info.get('state', 'unknown')
+                    stats[state] += 1
+                    stats['total'] += 1
+                    if state == 'open':
+                        stats['open_ports'] += 1
+
+                    port_id = port_info.get('port')
                     self.ports.append({
-                        'port': port_info.get('port'),
+                        'port': port_id,
+                        'port_num': self._to_port_num(port_id),
                         'protocol': port_info.get('protocol', 'tcp'),
-                        'state': port_info.get('state', 'unknown'),
+                        'state': state,
                         'service': {
                             'name': port_info.get('service', ''),
                             'product': port_info.get('product', ''),
@@ -183,49 +269,43 @@ class NmapResultParser:
 
     def _parse_text_output(self, output: str) -> None:
         """解析文本格式输出（备用方案）"""
-        lines = output.split('\n')
-
         # 提取目标
-        for line in lines:
-            if 'Starting Nmap' in line or 'scan initiated' in line:
-                # 尝试提取 IP
-                ip_match = re.search(r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})', line)
-                if ip_match:
-                    self.target = ip_match.group(1)
-                break
+        target_line = self._TARGET_LINE_RE.search(output)
+        if target_line:
+            # 尝试提取 IP
+            ip_match = self._IPV4_RE.search(target_line.group(0))
+            if ip_match:
+                self.target = ip_match.group(1)
 
         # 提取端口信息
-        port_pattern = re.compile(r'(\d+)/(tcp|udp)\s+(\S+)\s+(\S+)(?:\s+(.+))?')
-
-        for line in lines:
-            match = port_pattern.match(line.strip())
-            if match:
-                port_id, protocol, state, service, extra = match.groups()
-
-                service_info = {'name': service}
-                if extra:
-                    # 尝试解析额外信息
-                    if 'product' in extra.lower():
-                        parts = extra.split(maxsplit=1)
-                        if len(parts) > 1:
-                            service_info['product'] = parts[1]
-
-                self.ports.append({
-                    'port': port_id,
-                    'protocol': protocol,
-                    'state': state,
-                    'service': service_info
-                })
-
-    def _calculate_stats(self) -> None:
-        """计算统计信息"""
-        for port in self.ports:
-            state = port.get('state', 'unknown')
-            self.stats[state] += 1
-            self.stats['total'] += 1
-
-        # 统计开放端口
-        self.stats['open_ports'] = len([p for p in self.ports if p.get('state') == 'open'])
+        stats = self.stats
+        for match in self._PORT_RE.finditer(output):
+            port_id, protocol, state, service, extra = match.groups()
+            stats[state] += 1
+            stats['total'] += 1
+            if state == 'open':
+                stats['open_ports'] += 1
+
+            service_info = {'name': service}
+            if extra:
+                # 尝试解析额外信息
+                if 'product' in extra.lower():
+                    parts = extra.split(maxsplit=1)
+                    if len(parts) > 1:
+                        service_info['product'] = parts[1]
+
+            self.ports.append({
+                'port': port_id,
+                'port_num': int(port_id),
+                'protocol': protocol,
+                'state': state,
+                'service': service_info
+            })
+
+    @staticmethod
+    def _to_port_num(port_id: Any) -> int:
+        """端口号在解析阶段转换为整数（只转换一次），无法识别时为 0"""
+        return int(port_id) if str(port_id).isdigit() else 0
 
     def format_markdown(self, parsed_result: Dict[str, Any]) -> str:
         """
@@ -237,198 +317,168 @@ class NmapResultParser:
         Returns:
             Markdown 格式的字符串
         """
-        md_parts = []
+        # 各段落直接追加到同一个列表（每个片段自带换行），最后只 join 一次
+        out: List[str] = []
 
         # 标题
-        md_parts.append("# 🔍 Nmap 端口扫描报告\n")
+        out.append("# 🔍 Nmap 端口扫描报告\n")
 
         # 扫描摘要
-        md_parts.append("## 📊 扫描摘要\n")
-        md_parts.append(self._format_summary(parsed_result))
-        md_parts.append("\n")
+        out.append("## 📊 扫描摘要\n")
+        self._write_summary(parsed_result, out)
 
         # 目标信息
-        md_parts.append("## 🎯 扫描目标\n")
-        md_parts.append(self._format_target(parsed_result))
-        md_parts.append("\n")
+        out.append("## 🎯 扫描目标\n")
+        self._write_target(parsed_result, out)
 
         # 端口详情
-        md_parts.append("## 🔌 端口详情\n")
+        out.append("## 🔌 端口详情\n")
         if self.ports:
-            md_parts.append(self._format_ports(parsed_result))
-            md_parts.append("\n")
+            self._write_ports(parsed_result, out)
         else:
-            md_parts.append("未发现开放端口\n")
+            out.append("未发现开放端口\n")
 
         # 操作系统识别
         if self.os_guesses:
-            md_parts.append("## 💻 操作系统识别\n")
-            md_parts.append(self._format_os(parsed_result))
-            md_parts.append("\n")
+            out.append("## 💻 操作系统识别\n")
+            self._write_os(parsed_result, out)
 
         # 安全评估
-        md_parts.append("## ⚠️ 安全评估\n")
-        md_parts.append(self._format_security_assessment(parsed_result))
-        md_parts.append("\n")
+        out.append("## ⚠️ 安全评估\n")
+        self._write_security_assessment(parsed_result, out)
 
         # 优化建议
-        md_parts.append("## 💡 优化建议\n")
-        md_parts.append(self._format_recommendations(parsed_result))
-        md_parts.append("\n")
+        out.append("## 💡 优化建议\n")
+        self._write_recommendations(parsed_result, out)
 
-        return ''.join(md_parts)
+        return ''.join(out)
 
-    def _format_summary(self, result: Dict) -> str:
-        """格式化扫描摘要"""
+    def _write_summary(self, result: Dict, out: List[str]) -> None:
+        """写入扫描摘要"""
         stats = result.get('stats', {})
         open_ports = stats.get('open_ports', 0)
 
-        lines = []
-        lines.append(f"- **扫描目标**: `{result.get('target', 'Unknown')}`")
-        lines.append(f"- **发现端口**: {stats.get('total', 0)} 个")
-        lines.append(f"- **开放端口**: {open_ports} 个\n")
+        out.append(f"- **扫描目标**: `{result.get('target', 'Unknown')}`\n")
+        out.append(f"- **发现端口**: {stats.get('total', 0)} 个\n")
+        out.append(f"- **开放端口**: {open_ports} 个\n\n")
 
         if open_ports > 0:
-            lines.append("**端口状态分布**:\n")
+            out.append("**端口状态分布**:\n\n")
             for state in ['open', 'closed', 'filtered']:
                 if state in stats:
                     emoji = self.PORT_STATE_EMOJI.get(state, '⚪')
                     label = state.capitalize()
                     count = stats[state]
-                    lines.append(f"- {emoji} **{label}**: {count} 个")
+                    out.append(f"- {emoji} **{label}**: {count} 个\n")
 
-        return '\n'.join(lines)
-
-    def _format_target(self, result: Dict) -> str:
-        """格式化目标信息"""
-        lines = []
-        lines.append(f"**IP 地址**: `{result.get('target', 'Unknown')}`\n")
+    def _write_target(self, result: Dict, out: List[str]) -> None:
+        """写入目标信息"""
+        out.append(f"**IP 地址**: `{result.get('target', 'Unknown')}`\n\n")
 
         hostnames = result.get('hostnames', [])
         if hostnames:
-            lines.append("**主机名**:\n")
+            out.append("**主机名**:\n\n")
             for hostname in hostnames:
-                lines.append(f"- `{hostname.get('name')}` ({hostname.get('type')})")
-            lines.append("")
-
-        return '\n'.join(lines)
+                out.append(f"- `{hostname.get('name')}` ({hostname.get('type')})\n")
+            out.append("\n")
 
-    def _format_ports(self, result: Dict) -> str:
-        """格式化端口信息"""
+    def _write_ports(self, result: Dict, out: List[str]) -> None:
+        """写入端口信息"""
         ports = result.get('ports', [])
-
-        # 按状态分组
-        by_state = defaultdict(list)
-        for port in ports:
-            state = port.get('state', 'unknown')
-            by_state[state].append(port)
-
-        lines = []
-
-        # 显示开放端口（最重要）
-        if 'open' in by_state:
-            lines.append("### 🟢 开放端口\n")
-            for port in sorted(by_state['open'], key=lambda x: int(x.get('port', 0))):
-                lines.append(self._format_port_detail(port))
-                lines.append("")
-
-        # 显示其他状态
-        for state in ['open|filtered', 'filtered', 'closed']:
-            if state in by_state and by_state[state]:
-                emoji = self.PORT_STATE_EMOJI.get(state, '⚪')
-                label = state.capitalize()
-                lines.append(f"### {emoji} {label} 端口\n")
-
-                for port in sorted(by_state[state], key=lambda x: int(x.get('port', 0))):
-                    lines.append(f"**端口 {port.get('port')}/{port.get('protocol')}**")
-
-                lines.append("")
-
-        return '\n'.join(lines)
-
-    def _format_port_detail(self, port: Dict) -> str:
-        """格式化单个端口的详细信息"""
+        state_order = self._STATE_ORDER
+
+        # 只展示已知状态：按（状态顺序, 端口号）排序一次，再按状态分组输出
+        shown = sorted(
+            (p for p in ports if p.get('state') in state_order),
+            key=lambda p: (state_order[p['state']], p['port_num'])
+        )
+
+        for state, group in groupby(shown, key=itemgetter('state')):
+            # 显示开放端口（最重要）
+            if state == 'open':
+                out.append("### 🟢 开放端口\n\n")
+                for port in group:
+                    self._write_port_detail(port, out)
+                    out.append("\n")
+                continue
+
+            # 显示其他状态
+            emoji = self.PORT_STATE_EMOJI.get(state, '⚪')
+            label = state.capitalize()
+            out.append(f"### {emoji} {label} 端口\n\n")
+
+            for port in group:
+                out.append(f"**端口 {port.get('port')}/{port.get('protocol')}**\n")
+
+            out.append("\n")
+
+    def _write_port_detail(self, port: Dict, out: List[str]) -> None:
+        """写入单个端口的详细信息"""
         port_num = port.get('port')
         protocol = port.get('protocol', 'tcp')
         service = port.get('service', {})
 
-        lines = []
-        lines.append(f"#### 端口 {port_num}/{protocol}\n")
+        out.append(f"#### 端口 {port_num}/{protocol}\n\n")
 
         # 服务名称
         service_name = service.get('name', 'unknown')
-        lines.append(f"- **服务**: {service_name}")
+        out.append(f"- **服务**: {service_name}\n")
 
         # 产品和版本
         if service.get('product'):
             product = service['product']
             if service.get('version'):
                 product += f" {service['version']}"
-            lines.append(f"- **版本**: `{product}`")
+            out.append(f"- **版本**: `{product}`\n")
 
         # 额外信息
         if service.get('extrainfo'):
-            lines.append(f"- **额外信息**: {service['extrainfo']}")
+            out.append(f"- **额外信息**: {service['extrainfo']}\n")
 
         # 风险评估
         risk = self._assess_port_risk(port)
         if risk:
-            lines.append(f"- **风险等级**: {risk}")
-
-        return '\n'.join(lines)
+            out.append(f"- **风险等级**: {risk}\n")
 
     def _assess_port_risk(self, port: Dict) -> str:
         """评估端口风险"""
-        port_num = int(port.get('port', 0))
+        port_num = port['port_num']
         service = port.get('service', {})
         service_name = service.get('name', '').lower()
 
-        # 高危端口和服务
-        critical_ports = [22, 23, 135, 139, 445, 3389, 5900]
-        critical_services = ['telnet', 'ftp', 'rsh', 'rlogin', 'smtp']
-
-        # 中危端口
-        medium_ports = [21, 25, 53, 110, 143, 3306, 5432, 6379, 27017]
-
-        if port_num in critical_ports or service_name in critical_services:
-            return "🔴 **严重** - 未加密的敏感服务"
-        elif port_num in medium_ports:
-            return "🟠 **高危** - 可能存在已知漏洞"
-        elif port_num < 1024:
-            return "🟡 **中危** - 系统端口，需关注"
-        else:
-            return "🟢 **低危** - 应用端口"
+        if service_name in self._CRITICAL_SERVICES:
+            return self._RISK_CRITICAL
+        risk = self._PORT_RISK.get(port_num)
+        if risk:
+            return risk
+        return self._RISK_SYSTEM if port_num < 1024 else self._RISK_APP
 
-    def _format_os(self, result: Dict) -> str:
-        """格式化操作系统信息"""
+    def _write_os(self, result: Dict, out: List[str]) -> None:
+        """写入操作系统信息"""
         os_guesses = result.get('os_guesses', [])
 
-        lines = []
-        lines.append("**猜测结果**:\n")
+        out.append("**猜测结果**:\n\n")
 
         for i, os_guess in enumerate(os_guesses[:3], 1):
             name = os_guess.get('name', 'Unknown')
             accuracy = os_guess.get('accuracy', '0')
-            lines.append(f"{i}. **{name}** (准确度: {accuracy}%)")
+            out.append(f"{i}. **{name}** (准确度: {accuracy}%)\n")
 
         if len(os_guesses) > 3:
-            lines.append(f"\n> 还有 {len(os_guesses) - 3} 个猜测未显示")
-
-        return '\n'.join(lines)
+            out.append(f"\n> 还有 {len(os_guesses) - 3} 个猜测未显示\n")
 
-    def _format_security_assessment(self, result: Dict) -> str:
-        """格式化安全评估"""
+    def _write_security_assessment(self, result: Dict, out: List[str]) -> None:
+        """写入安全评估"""
         ports = result.get('ports', [])
         open_ports = [p for p in ports if p.get('state') == 'open']
-
-        lines = []
+        start = len(out)
 
         # 检查高危服务
         high_risk_services = []
         medium_risk_services = []
 
         for port in open_ports:
-            port_num = int(port.get('port', 0))
+            port_num = port['port_num']
             service = port.get('service', {})
             service_name = service.get('name', '').lower()
 
@@ -439,7 +489,7 @@ class NmapResultParser:
                     'service': 'SSH',
                     'issue': '可能存在暴力破解风险'
                 })
-            elif port_num in [23, 21] or service_name in ['telnet', 'ftp']:
+            elif port_num in self._PLAINTEXT_PORTS or service_name in self._PLAINTEXT_SERVICES:
                 high_risk_services.append({
                     'port': port_num,
                     'service': service_name.upper(),
@@ -459,75 +509,83 @@ class NmapResultParser:
                 })
 
         if high_risk_services:
-            lines.append("### 🚨 高危服务\n")
+            out.append("### 🚨 高危服务\n\n")
             for service in high_risk_services:
-                lines.append(f"- **端口 {service['port']}** ({service['service']}): {service['issue']}")
-            lines.append("")
+                out.append(f"- **端口 {service['port']}** ({service['service']}): {service['issue']}\n")
+            out.append("\n")
 
         # 端口暴露评估
         exposed_count = len(open_ports)
         if exposed_count > 10:
-            lines.append(f"### ⚠️ 攻击面过大\n")
-            lines.append(f"- 发现 {exposed_count} 个开放端口，攻击面过大")
-            lines.append(f"- 建议：关闭不必要的端口，使用防火墙限制访问\n")
+            out.append(f"### ⚠️ 攻击面过大\n\n")
+            out.append(f"- 发现 {exposed_count} 个开放端口，攻击面过大\n")
+            out.append(f"- 建议：关闭不必要的端口，使用防火墙限制访问\n\n")
         elif exposed_count > 5:
-            lines.append(f"### ⚠️ 端口暴露较多\n")
-            lines.append(f"- 发现 {exposed_count} 个开放端口")
-            lines.append(f"- 建议：审查每个端口的必要性\n")
+            out.append(f"### ⚠️ 端口暴露较多\n\n")
+            out.append(f"- 发现 {exposed_count} 个开放端口\n")
+            out.append(f"- 建议：审查每个端口的必要性\n\n")
 
-        return '\n'.join(lines) if lines else "未发现明显的安全问题\n"
+        if len(out) == start:
+            out.append("未发现明显的安全问题\n\n")
 
-    def _format_recommendations(self, result: Dict) -> str:
-        """生成优化建议"""
+    def _write_recommendations(self, result: Dict, out: List[str]) -> None:
+        """写入优化建议"""
         ports = result.get('ports', [])
         open_ports = [p for p in ports if p.get('state') == 'open']
 
-        lines = []
-
-        # 基于端口生成建议
-        port_nums = [int(p.get('port', 0)) for p in open_ports]
-
-        if 22 in port_nums:
-            lines.append("### 🔐 SSH 安全加固")
-            lines.append("1. 禁用密码登录，只允许密钥认证")
-            lines.append("2. 修改默认端口（22）")
-            lines.append("3. 配置 fail2ban 防暴力破解")
-            lines.append("4. 限制访问来源 IP（防火墙）")
-            lines.append("")
-
-        if 9200 in port_nums or any('elasticsearch' in p.get('service', {}).get('name', '').lower() for p in open_ports):
-            lines.append("### 🔍 Elasticsearch 安全加固")
-            lines.append("1. 启用 X-Pack 安全认证")
-            lines.append("2. 配置访问控制列表（ACL）")
-            lines.append("3. 禁用或限制 HTTP 接口")
-            lines.append("4. 升级到最新版本（当前版本过旧）")
-            lines.append("")
-
-        if any(p in port_nums for p in [80, 443, 8080, 8443]):
-            lines.append("### 🌐 Web 服务加固")
-            lines.append("1. 配置 HTTPS（使用 Let's Encrypt 免费证书）")
-            lines.append("2. 启用安全头部（HSTS, X-Frame-Options 等）")
-            lines.append("3. 配置 WAF 防护")
-            lines.append("4. 定期更新 Web 服务器软件")
-            lines.append("")
-
-        if 3306 in port_nums or 5432 in port_nums or 27017 in port_nums:
-            lines.append("### 💾 数据库安全加固")
-            lines.append("1. 不要暴露在公网（绑定 127.0.0.1）")
-            lines.append("2. 启用强密码认证")
-            lines.append("3. 限制访问来源 IP")
-            lines.append("4. 定期备份数据")
-            lines.append("")
+        # 基于端口生成建议：一次遍历构建端口集合与服务名集合，后续判断均为集合操作
+        port_set = {p['port_num'] for p in open_ports}
+        svc_names = {p.get('service', {}).get('name', '').lower() for p in open_ports}
+
+        if 22 in port_set:
+            out.append(
+                "### 🔐 SSH 安全加固\n"
+                "1. 禁用密码登录，只允许密钥认证\n"
+                "2. 修改默认端口（22）\n"
+                "3. 配置 fail2ban 防暴力破解\n"
+                "4. 限制访问来源 IP（防火墙）\n"
+                "\n"
+            )
+
+        if 9200 in port_set or any('elasticsearch' in name for name in svc_names):
+            out.append(
+                "### 🔍 Elasticsearch 安全加固\n"
+                "1. 启用 X-Pack 安全认证\n"
+                "2. 配置访问控制列表（ACL）\n"
+                "3. 禁用或限制 HTTP 接口\n"
+                "4. 升级到最新版本（当前版本过旧）\n"
+                "\n"
+            )
+
+        if not port_set.isdisjoint(self._WEB_PORTS):
+            out.append(
+                "### 🌐 Web 服务加固\n"
+                "1. 配置 HTTPS（使用 Let's Encrypt 免费证书）\n"
+                "2. 启用安全头部（HSTS, X-Frame-Options 等）\n"
+                "3. 配置 WAF 防护\n"
+                "4. 定期更新 Web 服务器软件\n"
+                "\n"
+            )
+
+        if not port_set.isdisjoint(self._DB_PORTS):
+            out.append(
+                "### 💾 数据库安全加固\n"
+                "1. 不要暴露在公网（绑定 127.0.0.1）\n"
+                "2. 启用强密码认证\n"
+                "3. 限制访问来源 IP\n"
+                "4. 定期备份数据\n"
+                "\n"
+            )
 
         # 通用建议
-        lines.append("### 📋 通用建议")
-        lines.append("1. **最小化暴露原则**: 只开放必要的端口")
-        lines.append("2. **防火墙配置**: 使用 iptables/UFW/firewalld 限制访问")
-        lines.append("3. **定期扫描**: 每月进行端口扫描和漏洞扫描")
-        lines.append("4. **入侵检测**: 配置 IDS/IPS 监控异常连接")
-        lines.append("5. **访问控制**: 使用 VPN 或堡垒机管理服务器")
-
-        return '\n'.join(lines)
+        out.append(
+            "### 📋 通用建议\n"
+            "1. **最小化暴露原则**: 只开放必要的端口\n"
+            "2. **防火墙配置**: 使用 iptables/UFW/firewalld 限制访问\n"
+            "3. **定期扫描**: 每月进行端口扫描和漏洞扫描\n"
+            "4. **入侵检测**: 配置 IDS/IPS 监控异常连接\n"
+            "5. **访问控制**: 使用 VPN 或堡垒机管理服务器\n"
+        )
 
 
 def format_nmap_result(stdout: str, stderr: str = '') -> str:
@@ -8,10 +8,36 @@ Nuclei 扫描结果解析和格式化工具
 4. 生成统计摘要和修复建议
 """
 
+import hashlib
 import json
+import logging
 import re
-from typing import Dict, List, Any, Optional
-from collections import defaultdict
+import threading
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# orjson 解码明显快于标准库；其 JSONDecodeError 继承自 json.JSONDecodeError
+try:
+    import orjson
+    json_loads = orjson.loads
+    HAS_ORJSON = True
+except ImportError:
+    json_loads = json.loads
+    HAS_ORJSON = False
+
+# format_nuclei_result 解析结果缓存：同一份输出在重复渲染/生成报告时只解析一次
+# 只缓存解析结果，Markdown 每次重新渲染，保证扫描时间等动态内容是最新的
+FORMAT_CACHE_SIZE = 64
+_format_cache: "OrderedDict[Tuple[bytes, bytes], Dict[str, Any]]" = OrderedDict()
+_format_cache_lock = threading.Lock()
+
+
+def _digest(text: str) -> bytes:
+    """计算输出内容摘要，作为缓存键（避免缓存中持有大段原始输出）"""
+    return hashlib.blake2b((text or '').encode('utf-8', 'surrogatepass'), digest_size=16).digest()
 
 
 class NucleiResultParser:
@@ -25,6 +51,22 @@ class NucleiResultParser:
         'low': {'emoji': '🟢', 'label': '低危', 'priority': 2},
         'info': {'emoji': '🔵', 'label': '信息', 'priority': 1}
     }
+    # 按展示顺序展开的 (等级, emoji, 标签, 优先级)，格式化循环直接解包，无需再查字典
+    _SEVERITY_ORDER = tuple(
+        (key, level['emoji'], level['label'], level['priority'])
+        for key, level in SEVERITY_LEVELS.items()
+    )
+
+    # ANSI 颜色代码（类加载时编译一次）
+    _ANSI_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+    # 文本输出中的严重性关键词（子串匹配、不区分大小写），按优先级排列
+    _TEXT_SEVERITIES = ('critical', 'high', 'medium', 'low')
+    _TEXT_SEVERITY_RE = re.compile('|'.join(_TEXT_SEVERITIES), re.IGNORECASE)
+
+    # JSONL 流式解码：raw_decode 在原字符串上按位置解码，无需先按行切分
+    _JSON_DECODER = json.JSONDecoder()
+    _NON_WS_RE = re.compile(r'\S')
 
     def __init__(self):
         self.vulnerabilities = []
@@ -67,42 +109,77 @@ class NucleiResultParser:
     def _parse_json_output(self, output: str) -> None:
         """解析 JSON 格式输出"""
         try:
-            # Nuclei JSON 输出是每行一个 JSON 对象
-            lines = output.strip().split('\n')
-            for line in lines:
-                if not line.strip():
-                    continue
-                try:
-                    vuln = json.loads(line)
-                    parsed_vuln = self._extract_vulnerability_info(vuln)
-                    if parsed_vuln:
-                        self.vulnerabilities.append(parsed_vuln)
-                        severity = parsed_vuln.get('severity', 'info').lower()
-                        self.by_severity[severity].append(parsed_vuln)
-                except json.JSONDecodeError:
-                    # 可能是多个 JSON 对象连在一起
-                    continue
+            # Nuclei JSON 输出是每行一个 JSON 对象（也兼容多个对象连在一起）
+            for vuln in self._iter_json_objects(output):
+                parsed_vuln = self._extract_vulnerability_info(vuln)
+                if parsed_vuln:
+                    self.vulnerabilities.append(parsed_vuln)
+                    # _extract_vulnerability_info 已归一化为小写的合法等级
+                    self.by_severity[parsed_vuln['severity']].append(parsed_vuln)
         except Exception as e:
-            print(f"JSON 解析错误: {str(e)}")
+            logger.debug("JSON 解析错误: %s", e)
+
+    def _iter_json_objects(self, output: str) -> Iterator[Any]:
+        """依次解码输出中的 JSON 对象"""
+        if not HAS_ORJSON:
+            yield from self._raw_decode_objects(output)
+            return
+
+        # orjson 没有 raw_decode：按行整体解码，失败的行（多个对象连在一起等）再逐个扫描
+        for line in output.split('\n'):
+            if not line or line.isspace():
+                continue
+            try:
+                yield json_loads(line)
+            except json.JSONDecodeError:
+                yield from self._raw_decode_objects(line)
+
+    def _raw_decode_objects(self, output: str) -> Iterator[Any]:
+        """用 raw_decode 依次解码 JSON 对象，遇到无法解析的内容时跳到下一行重新同步"""
+        decode = self._JSON_DECODER.raw_decode
+        next_token = self._NON_WS_RE.search
+        pos = 0
+        while True:
+            match = next_token(output, pos)
+            if match is None:
+                return
+            pos = match.start()
+            try:
+                obj, pos = decode(output, pos)
+            except json.JSONDecodeError:
+                newline = output.find('\n', pos)
+                if newline < 0:
+                    return
+                pos = newline + 1
+                continue
+            yield obj
 
     def _parse_text_output(self, output: str) -> None:
         """解析文本格式输出（备用方案）"""
         # 移除 ANSI 颜色代码
         clean_output = self._remove_ansi_codes(output)
 
-        # 查找漏洞相关的行
-        lines = clean_output.split('\n')
-        for line in lines:
-            # 尝试提取漏洞信息
-            if any(sev in line.lower() for sev in ['critical', 'high', 'medium', 'low']):
-                # 这里是简化的文本解析，实际可能需要更复杂的正则
-                self.vulnerabilities.append({
-                    'severity': self._extract_severity(line),
-                    'name': 'Unknown',
-                    'description': line.strip(),
-                    'url': 'N/A',
-                    'tags': []
-                })
+        # 查找漏洞相关的行：一次正则扫描同时完成过滤和严重性提取
+        find_severities = self._TEXT_SEVERITY_RE.findall
+        for line in clean_output.split('\n'):
+            hits = find_severities(line)
+            if not hits:
+                continue
+            if len(hits) == 1:
+                severity = hits[0].lower()
+            else:
+                # 同一行出现多个关键词时取优先级最高的
+                found = {hit.lower() for hit in hits}
+                severity = next(sev for sev in self._TEXT_SEVERITIES if sev in found)
+
+            # 这里是简化的文本解析，实际可能需要更复杂的正则
+            self.vulnerabilities.append({
+                'severity': severity,
+                'name': 'Unknown',
+                'description': line.strip(),
+                'url': 'N/A',
+                'tags': []
+            })
 
     def _extract_vulnerability_info(self, vuln: Dict) -> Optional[Dict]:
         """从 Nuclei JSON 结果提取关键信息"""
@@ -111,7 +188,7 @@ class NucleiResultParser:
 
             # 提取 CVE ID
             tags = info.get('tags', [])
-            cve_ids = [tag for tag in tags if tag.startswith('CVE-') or tag.startswith('cve-')]
+            cve_ids = [tag for tag in tags if tag.startswith(('CVE-', 'cve-'))]
 
             # 提取严重性
             severity = vuln.get('severity', 'info').lower()
@@ -133,27 +210,19 @@ class NucleiResultParser:
                 'references': info.get('reference', [])
             }
         except Exception as e:
-            print(f"提取漏洞信息错误: {str(e)}")
+            logger.debug("提取漏洞信息错误: %s", e)
             return None
 
-    def _extract_severity(self, line: str) -> str:
-        """从文本行提取严重性"""
-        for sev in ['critical', 'high', 'medium', 'low', 'info']:
-            if sev in line.lower():
-                return sev
-        return 'info'
-
     def _remove_ansi_codes(self, text: str) -> str:
         """移除 ANSI 颜色代码"""
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-        return ansi_escape.sub('', text)
+        return self._ANSI_RE.sub('', text)
 
     def _calculate_stats(self) -> None:
         """计算统计信息"""
-        for vuln in self.vulnerabilities:
-            severity = vuln.get('severity', 'info').lower()
-            self.stats[severity] += 1
-            self.stats['total'] += 1
+        # JSON/文本两条解析路径产出的 severity 均已是小写的合法等级
+        self.stats = defaultdict(int, Counter(vuln['severity'] for vuln in self.vulnerabilities))
+        if self.vulnerabilities:
+            self.stats['total'] = len(self.vulnerabilities)
 
     def format_markdown(self, parsed_result: Dict[str, Any]) -> str:
         """
@@ -165,141 +234,134 @@ class NucleiResultParser:
         Returns:
             Markdown 格式的字符串
         """
-        md_parts = []
+        return ''.join(self.iter_markdown(parsed_result))
+
+    def iter_markdown(self, parsed_result: Dict[str, Any]) -> Iterator[str]:
+        """
+        逐段生成 Markdown（每个片段自带换行），供流式输出或一次性 join 使用
+
+        Args:
+            parsed_result: parse() 方法返回的解析结果
 
+        Yields:
+            Markdown 文本片段
+        """
         # 标题
-        md_parts.append("# 🔍 Nuclei 漏洞扫描报告\n")
+        yield "# 🔍 Nuclei 漏洞扫描报告\n"
 
         # 统计摘要
-        md_parts.append("## 📊 扫描摘要\n")
-        md_parts.append(self._format_summary(parsed_result))
-        md_parts.append("\n")
+        yield "## 📊 扫描摘要\n"
+        yield from self._iter_summary(parsed_result)
 
         # 按严重性分组显示
-        md_parts.append("## 🎯 漏洞详情\n")
+        yield "## 🎯 漏洞详情\n"
 
         vulnerabilities = parsed_result.get('vulnerabilities', [])
         by_severity = parsed_result.get('by_severity', {})
 
         if not vulnerabilities:
-            md_parts.append("✅ **未发现漏洞**\n\n")
-            md_parts.append("扫描完成，未发现安全漏洞。但这不代表系统绝对安全，建议定期进行深度扫描。\n")
+            yield "✅ **未发现漏洞**\n\n"
+            yield "扫描完成，未发现安全漏洞。但这不代表系统绝对安全，建议定期进行深度扫描。\n"
         else:
             # 按严重性排序显示
-            for severity in ['critical', 'high', 'medium', 'low', 'info']:
-                if severity in by_severity and by_severity[severity]:
-                    md_parts.append(self._format_severity_section(severity, by_severity[severity]))
-                    md_parts.append("\n")
+            for severity, emoji, label, _ in self._SEVERITY_ORDER:
+                vulns = by_severity.get(severity)
+                if vulns:
+                    yield from self._iter_severity_section(emoji, label, vulns)
 
         # 修复建议
-        md_parts.append("## 💡 修复建议\n")
-        md_parts.append(self._format_recommendations(parsed_result))
-        md_parts.append("\n")
-
-        return ''.join(md_parts)
+        yield "## 💡 修复建议\n"
+        yield from self._iter_recommendations(parsed_result)
 
-    def _format_summary(self, result: Dict) -> str:
-        """格式化统计摘要"""
+    def _iter_summary(self, result: Dict) -> Iterator[str]:
+        """生成统计摘要"""
         stats = result.get('stats', {})
         total = stats.get('total', 0)
 
-        lines = []
-        lines.append(f"- **扫描时间**: {self._get_timestamp()}")
-        lines.append(f"- **发现漏洞**: {total} 个\n")
+        yield f"- **扫描时间**: {self._get_timestamp()}\n"
+        yield f"- **发现漏洞**: {total} 个\n\n"
 
         if total == 0:
-            return '\n'.join(lines)
+            return
 
-        lines.append("**漏洞分布**:\n")
+        yield "**漏洞分布**:\n\n"
 
-        for severity in ['critical', 'high', 'medium', 'low', 'info']:
+        for severity, emoji, label, _ in self._SEVERITY_ORDER:
             if severity in stats:
-                level_info = self.SEVERITY_LEVELS[severity]
-                count = stats[severity]
-                emoji = level_info['emoji']
-                label = level_info['label']
-                lines.append(f"- {emoji} **{label}**: {count} 个")
+                yield f"- {emoji} **{label}**: {stats[severity]} 个\n"
 
-        return '\n'.join(lines)
-
-    def _format_severity_section(self, severity: str, vulns: List[Dict]) -> str:
-        """格式化单个严重性级别的漏洞"""
-        level_info = self.SEVERITY_LEVELS[severity]
-        emoji = level_info['emoji']
-        label = level_info['label']
-
-        lines = []
-        lines.append(f"### {emoji} {label}漏洞 ({len(vulns)} 个)\n")
+    def _iter_severity_section(self, emoji: str, label: str, vulns: List[Dict]) -> Iterator[str]:
+        """生成单个严重性级别的漏洞"""
+        yield f"### {emoji} {label}漏洞 ({len(vulns)} 个)\n\n"
 
+        # 每个漏洞拼成一个片段再输出（CPython 对局部字符串 += 做原地扩展）
         for i, vuln in enumerate(vulns, 1):
-            lines.append(f"#### {i}. {vuln.get('name', 'Unknown')}\n")
+            block = f"#### {i}. {vuln.get('name', 'Unknown')}\n\n"
 
             # CVE ID
             if vuln.get('cve_ids'):
-                cve_list = ', '.join(vuln['cve_ids'])
-                lines.append(f"- **CVE**: `{cve_list}`")
+                block += f"- **CVE**: `{', '.join(vuln['cve_ids'])}`\n"
 
             # 受影响 URL
-            lines.append(f"- **受影响地址**: `{vuln.get('url', 'N/A')}`")
+            block += f"- **受影响地址**: `{vuln.get('url', 'N/A')}`\n"
 
             # 描述
             if vuln.get('description'):
-                lines.append(f"- **描述**: {vuln['description']}")
+                block += f"- **描述**: {vuln['description']}\n"
 
             # CVSS 评分
             if vuln.get('cvss'):
-                lines.append(f"- **CVSS**: {vuln['cvss']}")
+                block += f"- **CVSS**: {vuln['cvss']}\n"
 
             # 标签
             if vuln.get('tags'):
                 tags_str = ' '.join([f"`{tag}`" for tag in vuln['tags'][:5]])
-                lines.append(f"- **标签**: {tags_str}")
+                block += f"- **标签**: {tags_str}\n"
 
             # 参考链接
             if vuln.get('references'):
                 ref_links = '\n  '.join([f"- [{ref}]({ref})" for ref in vuln['references'][:3]])
-                lines.append(f"- **参考**:\n  {ref_links}")
-
-            lines.append("")
+                block += f"- **参考**:\n  {ref_links}\n"
 
-        return '\n'.join(lines)
+            yield block + "\n"
 
-    def _format_recommendations(self, result: Dict) -> str:
+    def _iter_recommendations(self, result: Dict) -> Iterator[str]:
         """生成修复建议"""
         stats = result.get('stats', {})
 
-        lines = []
-
         # 优先级建议
         if stats.get('critical', 0) > 0:
-            lines.append("### 🚨 紧急处理")
-            lines.append(f"发现 {stats['critical']} 个严重漏洞，建议立即处理：")
-            lines.append("1. 隔离受影响的系统")
-            lines.append("2. 应用最新的安全补丁")
-            lines.append("3. 检查是否存在已遭受攻击的迹象")
-            lines.append("")
+            yield "### 🚨 紧急处理\n"
+            yield f"发现 {stats['critical']} 个严重漏洞，建议立即处理：\n"
+            yield (
+                "1. 隔离受影响的系统\n"
+                "2. 应用最新的安全补丁\n"
+                "3. 检查是否存在已遭受攻击的迹象\n"
+                "\n"
+            )
 
         if stats.get('high', 0) > 0:
-            lines.append("### ⚠️ 高优先级")
-            lines.append(f"发现 {stats['high']} 个高危漏洞，建议尽快修复：")
-            lines.append("1. 评估业务影响")
-            lines.append("2. 制定修复计划")
-            lines.append("3. 在维护窗口期内更新")
-            lines.append("")
+            yield "### ⚠️ 高优先级\n"
+            yield f"发现 {stats['high']} 个高危漏洞，建议尽快修复：\n"
+            yield (
+                "1. 评估业务影响\n"
+                "2. 制定修复计划\n"
+                "3. 在维护窗口期内更新\n"
+                "\n"
+            )
 
         # 一般建议
-        lines.append("### 📋 通用建议")
-        lines.append("1. **定期扫描**: 建议每月至少进行一次完整扫描")
-        lines.append("2. **持续监控**: 配置自动化监控和告警")
-        lines.append("3. **补丁管理**: 建立漏洞补丁管理流程")
-        lines.append("4. **安全加固**: 遵循安全基线和最佳实践")
-        lines.append("5. **访问控制**: 限制不必要的网络暴露")
-
-        return '\n'.join(lines)
+        yield (
+            "### 📋 通用建议\n"
+            "1. **定期扫描**: 建议每月至少进行一次完整扫描\n"
+            "2. **持续监控**: 配置自动化监控和告警\n"
+            "3. **补丁管理**: 建立漏洞补丁管理流程\n"
+            "4. **安全加固**: 遵循安全基线和最佳实践\n"
+            "5. **访问控制**: 限制不必要的网络暴露\n"
+        )
 
     def _get_timestamp(self) -> str:
         """获取当前时间戳"""
-        from datetime import datetime
         return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
 
@@ -314,8 +376,19 @@ def format_nuclei_result(stdout: str, stderr: str = '') -> str:
     Returns:
         格式化后的 Markdown 字符串
     """
+    key = (_digest(stdout), _digest(stderr))
+    with _format_cache_lock:
+        parsed = _format_cache.get(key)
+        if parsed is not None:
+            _format_cache.move_to_end(key)
+
     parser = NucleiResultParser()
-    parsed = parser.parse(stdout, stderr)
+    if parsed is None:
+        parsed = parser.parse(stdout, stderr)
+        with _format_cache_lock:
+            _format_cache[key] = parsed
+            if len(_format_cache) > FORMAT_CACHE_SIZE:
+                _format_cache.popitem(last=False)
     return parser.format_markdown(parsed)
 
 
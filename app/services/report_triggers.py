@@ -0,0 +1,20 @@
+"""
+HexStrike 报告安全建议触发规则
+HTML 与 PDF 报告共用，保证两种报告给出的修复建议一致
+"""
+import re
+
+# 安全建议触发关键词（单次扫描匹配全部关键词，无需生成小写副本）
+# 关键词只有几个，正则多选已足够，不依赖可选的 pyahocorasick
+NMAP_TRIGGERS_RE = re.compile(r'ssh|elasticsearch|:9200', re.IGNORECASE)
+NUCLEI_TRIGGERS_RE = re.compile(r'critical|high', re.IGNORECASE)
+
+
+def scan_keywords(pattern, text: str, limit: int) -> set:
+    """扫描文本中出现的触发关键词（小写），命中 limit 个不同关键词后提前结束"""
+    hits = set()
+    for match in pattern.finditer(text):
+        hits.add(match.group(0).lower())
+        if len(hits) >= limit:
+            break
+    return hits
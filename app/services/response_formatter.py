@@ -2,15 +2,87 @@
 响应格式化器
 统一处理 HexStrike 结果格式化、HTML 报告生成等
 """
+import io
 import json
 import logging
-from typing import Dict, Any, Optional, Generator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Any, Optional, Generator, Iterator
 from pathlib import Path
 from django.conf import settings
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+# orjson 序列化明显快于标准库，未安装时回退到 json
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _dumps_pretty(data: Any) -> str:
+    """以 2 空格缩进序列化为 JSON 文本（保留非 ASCII 字符）"""
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # orjson 不支持的类型（如超出 64 位的整数）交给标准库处理
+            pass
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+# 风险等级图标
+RISK_ICONS = {
+    'critical': '🔴 严重',
+    'high': '🟠 高危',
+    'medium': '🟡 中危',
+    'low': '🟢 低危',
+    'info': '🔵 信息'
+}
+
+# 报告生成类（首次生成报告时才导入，之后复用）
+_REPORTER_CLASSES = None
+
+
+def _reporter_classes():
+    """延迟导入 HTML/PDF/ZIP 报告类，并缓存在模块级变量中"""
+    global _REPORTER_CLASSES
+    if _REPORTER_CLASSES is None:
+        from app.services.hexstrike_html_reporter import HexStrikeHTMLReporter
+        from app.services.hexstrike_pdf_reporter import HexStrikePDFReporter
+        from app.services.hexstrike_zip_reporter import HexStrikeZipReporter
+        _REPORTER_CLASSES = (HexStrikeHTMLReporter, HexStrikePDFReporter, HexStrikeZipReporter)
+    return _REPORTER_CLASSES
+
+
+def _ssl_items(ssl_info: Dict[str, Any]) -> Iterator[str]:
+    """SSL/TLS 信息的展示条目"""
+    yield "✅ 证书有效" if ssl_info.get('valid') else "⚠️ 证书无效或过期"
+    if ssl_info.get('issuer'):
+        yield f"颁发者：{ssl_info['issuer']}"
+
+
+# 目标画像各段落（按展示顺序）：(字段, 标题, 最多显示条数, 超出时的单位, 展开条目, 单条格式)
+# 展开条目为 None 的字段是单行值，直接拼在标题后
+_PROFILE_SECTIONS = (
+    ('ip_addresses', "**🌐 IP 地址**：", None, None, iter, lambda ip: f"  - `{ip}`"),
+    ('subdomains', "**🔗 子域名**：", 10, '子域名', iter, lambda sub: f"  - `{sub}`"),
+    ('open_ports', "**🔌 开放端口**：", 15, '端口', iter,
+     lambda p: f"  - **{p.get('port', 'Unknown')}** ({p.get('service', 'Unknown')})"),
+    ('services', "**⚙️ 发现的服务**：", 10, '服务', dict.items, lambda kv: f"  - **{kv[0]}**：{kv[1]}"),
+    ('technologies', "**💻 识别的技术**：", 15, '技术', iter, lambda tech: f"  - {tech}"),
+    ('cloud_provider', "**☁️ 云服务提供商**：", None, None, None, None),
+    ('cms_type', "**📝 CMS 类型**：", None, None, None, None),
+    ('ssl_info', "**🔐 SSL/TLS 信息**：", None, None, _ssl_items, lambda item: f"  - {item}"),
+    ('security_headers', "**🛡️ 安全头部**：", None, None, dict.items,
+     lambda kv: f"  - {'✅' if kv[1] else '❌'} {kv[0]}"),
+    ('endpoints', "**🔗 发现的端点**：", 15, '端点', iter, lambda ep: f"  - `{ep}`"),
+)
+# 目标画像中的详细字段（均为空时只输出基本信息）
+_OPTIONAL_KEYS = tuple(section[0] for section in _PROFILE_SECTIONS)
+
 
 class ResponseFormatter:
     """统一的响应格式化器"""
@@ -29,118 +101,46 @@ class ResponseFormatter:
         if not target_profile:
             return "_暂无目标画像信息_\n"
 
-        lines = []
-
         # 基本信息
         target = target_profile.get('target', 'Unknown')
         target_type = target_profile.get('target_type', 'Unknown')
         risk_level = target_profile.get('risk_level', 'unknown')
         attack_surface_score = target_profile.get('attack_surface_score', 0)
 
-        # 风险等级图标
-        risk_icons = {
-            'critical': '🔴 严重',
-            'high': '🟠 高危',
-            'medium': '🟡 中危',
-            'low': '🟢 低危',
-            'info': '🔵 信息'
-        }
-        risk_display = risk_icons.get(risk_level.lower(), f'⚪ {risk_level}')
-
-        lines.append(f"**🎯 扫描目标**：`{target}`")
-        lines.append(f"**📋 目标类型**：{target_type}")
-        lines.append(f"**⚠️ 风险等级**：{risk_display}")
-        lines.append(f"**📊 攻击面评分**：{attack_surface_score}/10")
-        lines.append("")
-
-        # IP 地址
-        if target_profile.get('ip_addresses'):
-            lines.append("**🌐 IP 地址**：")
-            for ip in target_profile['ip_addresses']:
-                lines.append(f"  - `{ip}`")
-            lines.append("")
-
-        # 域名/子域名
-        if target_profile.get('subdomains'):
-            lines.append("**🔗 子域名**：")
-            for subdomain in target_profile['subdomains'][:10]:  # 限制显示数量
-                lines.append(f"  - `{subdomain}`")
-            if len(target_profile['subdomains']) > 10:
-                lines.append(f"  - _还有 {len(target_profile['subdomains']) - 10} 个子域名..._")
-            lines.append("")
-
-        # 开放端口
-        if target_profile.get('open_ports'):
-            lines.append("**🔌 开放端口**：")
-            for port_info in target_profile['open_ports'][:15]:  # 限制显示数量
-                port = port_info.get('port', 'Unknown')
-                service = port_info.get('service', 'Unknown')
-                lines.append(f"  - **{port}** ({service})")
-            if len(target_profile['open_ports']) > 15:
-                lines.append(f"  - _还有 {len(target_profile['open_ports']) - 15} 个端口..._")
-            lines.append("")
-
-        # 服务
-        if target_profile.get('services'):
-            lines.append("**⚙️ 发现的服务**：")
-            for service_name, service_info in list(target_profile['services'].items())[:10]:
-                lines.append(f"  - **{service_name}**：{service_info}")
-            if len(target_profile['services']) > 10:
-                lines.append(f"  - _还有 {len(target_profile['services']) - 10} 个服务..._")
-            lines.append("")
-
-        # 技术/框架
-        if target_profile.get('technologies'):
-            lines.append("**💻 识别的技术**：")
-            for tech in target_profile['technologies'][:15]:
-                lines.append(f"  - {tech}")
-            if len(target_profile['technologies']) > 15:
-                lines.append(f"  - _还有 {len(target_profile['technologies']) - 15} 个技术..._")
-            lines.append("")
+        risk_display = RISK_ICONS.get(risk_level.lower(), f'⚪ {risk_level}')
 
-        # 云服务提供商
-        if target_profile.get('cloud_provider'):
-            lines.append(f"**☁️ 云服务提供商**：{target_profile['cloud_provider']}")
-            lines.append("")
-
-        # CMS
-        if target_profile.get('cms_type'):
-            lines.append(f"**📝 CMS 类型**：{target_profile['cms_type']}")
-            lines.append("")
+        lines = [
+            f"**🎯 扫描目标**：`{target}`",
+            f"**📋 目标类型**：{target_type}",
+            f"**⚠️ 风险等级**：{risk_display}",
+            f"**📊 攻击面评分**：{attack_surface_score}/10",
+            "",
+        ]
 
-        # SSL/TLS 信息
-        if target_profile.get('ssl_info'):
-            lines.append("**🔐 SSL/TLS 信息**：")
-            ssl_info = target_profile['ssl_info']
-            if ssl_info.get('valid'):
-                lines.append("  - ✅ 证书有效")
+        # 没有任何详细信息时直接给出提示，不再逐段检查
+        if not any(target_profile.get(key) for key in _OPTIONAL_KEYS):
+            lines.append("_目标画像信息较少，等待扫描结果补充..._\n")
+            return '\n'.join(lines)
+
+        # 各详细段落按表驱动输出
+        for key, header, limit, unit, expand, fmt in _PROFILE_SECTIONS:
+            value = target_profile.get(key)
+            if not value:
+                continue
+            if expand is None:
+                lines.append(f"{header}{value}")
             else:
-                lines.append("  - ⚠️ 证书无效或过期")
-            if ssl_info.get('issuer'):
-                lines.append(f"  - 颁发者：{ssl_info['issuer']}")
+                lines.append(header)
+                items = expand(value)
+                if limit is not None:
+                    items = islice(items, limit)
+                lines.extend(map(fmt, items))
+                if limit is not None:
+                    total = len(value)
+                    if total > limit:
+                        lines.append(f"  - _还有 {total - limit} 个{unit}..._")
             lines.append("")
 
-        # 安全头部
-        if target_profile.get('security_headers'):
-            lines.append("**🛡️ 安全头部**：")
-            for header_name, header_value in target_profile['security_headers'].items():
-                status = "✅" if header_value else "❌"
-                lines.append(f"  - {status} {header_name}")
-            lines.append("")
-
-        # 端点
-        if target_profile.get('endpoints'):
-            lines.append("**🔗 发现的端点**：")
-            for endpoint in target_profile['endpoints'][:15]:
-                lines.append(f"  - `{endpoint}`")
-            if len(target_profile['endpoints']) > 15:
-                lines.append(f"  - _还有 {len(target_profile['endpoints']) - 15} 个端点..._")
-            lines.append("")
-
-        # 如果没有任何详细信息
-        if len(lines) <= 4:  # 只有基本标题行
-            lines.append("_目标画像信息较少，等待扫描结果补充..._\n")
-
         return '\n'.join(lines)
 
     @staticmethod
@@ -206,8 +206,8 @@ class ResponseFormatter:
             stdout = nuclei_data.get('stdout', '')
             stderr = nuclei_data.get('stderr', '')
 
-            # 检查是否超时
-            if nuclei_data.get('timed_out') or 'timed out' in str(nuclei_data).lower():
+            # 检查是否超时：以 timed_out 标记为准，仅在 stderr 开头做有限回退检查
+            if nuclei_data.get('timed_out') or (stderr and 'timed out' in stderr[:500].lower()):
                 yield "## 🔍 Nuclei 漏洞扫描结果\n\n"
                 yield "⚠️ 扫描超时（超过10分钟），建议分端口扫描或减少扫描范围\n\n"
             elif stdout or stderr:
@@ -225,7 +225,7 @@ class ResponseFormatter:
         # 4. 如果没有 nmap/nuclei 结果，但有其他数据
         if 'nmap_results' not in data and 'nuclei_results' not in data:
             yield "## 📊 分析结果\n\n"
-            yield f"```json\n{json.dumps(data, ensure_ascii=False, indent=2)}\n```\n\n"
+            yield f"```json\n{_dumps_pretty(data)}\n```\n\n"
 
         # 5. 生成 ZIP 报告包（如果需要）
         if include_html_report:
@@ -265,34 +265,40 @@ class ResponseFormatter:
             str: ZIP 报告文件名，失败返回 None
         """
         try:
-            from app.services.hexstrike_html_reporter import HexStrikeHTMLReporter
-            from app.services.hexstrike_pdf_reporter import HexStrikePDFReporter
-            from app.services.hexstrike_zip_reporter import HexStrikeZipReporter
+            HexStrikeHTMLReporter, HexStrikePDFReporter, HexStrikeZipReporter = _reporter_classes()
 
-            # 1. 生成 HTML 报告
-            html_reporter = HexStrikeHTMLReporter()
-            html_filename = html_reporter.generate_report(
+            report_kwargs = dict(
                 target=target,
                 nmap_results=nmap_results,
                 nuclei_results=nuclei_results,
                 target_profile=target_profile
             )
 
+            # 1/2. HTML 与 PDF 报告互不依赖，并行生成
+            html_reporter = HexStrikeHTMLReporter()
+            pdf_reporter = HexStrikePDFReporter()
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                html_future = executor.submit(html_reporter.generate_report, **report_kwargs)
+                pdf_future = executor.submit(pdf_reporter.generate_pdf_report, **report_kwargs)
+                try:
+                    html_filename = html_future.result()
+                except Exception as e:
+                    logger.error(f"HTML 报告生成异常: {e}", exc_info=True)
+                    html_filename = None
+                pdf_filename = pdf_future.result()
+
             if not html_filename:
                 logger.error("HTML 报告生成失败")
+                # PDF 与 HTML 并行生成，HTML 失败时不会再打包，删除已生成的 PDF 避免残留在 reports 目录
+                if pdf_filename:
+                    try:
+                        (pdf_reporter.reports_dir / pdf_filename).unlink()
+                    except OSError as e:
+                        logger.warning(f"删除未打包的 PDF 报告失败: {pdf_filename}, {e}")
                 return None
 
             logger.info(f"HTML 报告已生成: {html_filename}")
 
-            # 2. 生成 PDF 报告
-            pdf_reporter = HexStrikePDFReporter()
-            pdf_filename = pdf_reporter.generate_pdf_report(
-                target=target,
-                nmap_results=nmap_results,
-                nuclei_results=nuclei_results,
-                target_profile=target_profile
-            )
-
             if pdf_filename:
                 logger.info(f"PDF 报告已生成: {pdf_filename}")
             else:
@@ -397,13 +403,12 @@ class ResponseFormatter:
         Returns:
             str: 格式化后的完整文本
         """
-        parts = []
-        for chunk in ResponseFormatter.format_hexstrike_result(
+        buffer = io.StringIO()
+        buffer.writelines(ResponseFormatter.format_hexstrike_result(
             target, result, include_html_report
-        ):
-            parts.append(chunk)
+        ))
 
-        return ''.join(parts)
+        return buffer.getvalue()
 
     @staticmethod
     def format_hexstrike_result_with_html_download(
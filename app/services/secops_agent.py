@@ -5,9 +5,10 @@ SecOps智能体服务
 import json
 import logging
 import re
-import subprocess
-import sys
-from typing import Dict, Any, List, Optional, Generator
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+from typing import Dict, Any, List, Optional, Generator, Tuple
 from app.services.task_executor import TaskExecutor
 from app.services.asset_matcher import AssetMatcher
 from app.models import Vulnerability, Asset, Plugin, HexStrikeExecution
@@ -17,12 +18,272 @@ from app.services.task_tools import (
     list_assets,
 )
 from django.conf import settings
+from django.db import connections
 from app.services.hexstrike_client import HexStrikeClient
+from app.services.intent_targets import IPV4_RE, DOMAIN_RE, HOST_RE, find_history_target
 
 logger = logging.getLogger(__name__)
 
-# 可用操作列表
-AVAILABLE_ACTIONS = [
+# orjson 编解码明显快于标准库；其 JSONDecodeError 继承自 json.JSONDecodeError
+try:
+    import orjson
+    json_loads = orjson.loads
+    HAS_ORJSON = True
+except ImportError:
+    json_loads = json.loads
+    HAS_ORJSON = False
+
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+# 多关键词一次扫描（Aho-Corasick 自动机）；未安装时回退为逐类正则匹配
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except ImportError:
+    HAS_AHOCORASICK = False
+
+# 单条用户消息的最大长度（字符）
+MAX_MESSAGE_LENGTH = 20000
+# 对话历史的 token 预算（按 cl100k_base 估算，为输出留足空间）
+MAX_HISTORY_TOKENS = 6000
+# 同一轮多个工具调用并发执行的最大线程数
+MAX_TOOL_WORKERS = 4
+# 系统提示词中启用插件列表的缓存时间（秒）：插件启停后最多延迟这么久生效
+PLUGINS_DESC_TTL = 60
+
+# 无工具调用、直接回复时先输出的思考过程标记（前端显示为灰色小字）
+THINKING_MARKER = json.dumps({
+    "type": "thinking",
+    "content": "正在思考...",
+    "expandable": True
+})
+
+# 意图分析用到的正则（模块加载时编译一次；IP/域名/主机名规则见 intent_targets）
+_DAYS_RE = re.compile(r'(\d+)\s*天')
+
+# 无效的组件名称模式（合并为一个正则，按 re.match 语义从开头匹配）
+_INVALID_COMPONENT_PATTERNS = (
+    r'^(two|three|four|five|six|seven|eight|nine|ten)\s+',  # 数字开头的描述（如"two heap"）
+    r'^(xxe|xss|csrf|sql\s*injection|rce|rfi|lfi)',  # 漏洞类型
+    r'^(before|after|through|to|until|up\s+to|from)\s+',  # 版本范围关键词（必须后面跟内容）
+    r'^[<>=]+\s*\d+',  # 版本比较符
+    r'^\d+\.\d+',  # 版本号开头
+    # 修复：只匹配真正的版本范围字符串（包含数字和版本关键词的组合）
+    r'^(before|after|through|to|until|up\s+to|from)\s+\d+',  # "before 2.2.1" 等
+    r'^\d+\s+(before|after|through|to|until|up\s+to|from)\s+\d+',  # "2.0.0 before 2.2.1" 等
+    r'^[\d\s<>=]+$',  # 只包含数字、空格、比较符（不包含字母，避免误判"go"等）
+)
+_INVALID_COMPONENT_RE = re.compile(
+    '|'.join(f'(?:{pattern})' for pattern in _INVALID_COMPONENT_PATTERNS),
+    re.IGNORECASE
+)
+# 常见编程语言/框架白名单（即使很短也认为是有效的组件名称）
+_VALID_SHORT_NAMES = frozenset([
+    'go', 'golang', 'python', 'java', 'nodejs', 'node.js', 'rust', 'php', 'ruby',
+    'c', 'cpp', 'c++', 'c#', 'js', 'ts', 'tsx', 'jsx', 'html', 'css', 'sql',
+    'curl', 'wget', 'git', 'vim', 'emacs', 'bash', 'zsh', 'sh'
+])
+# 无效的组件名称（整词匹配）
+_INVALID_EXACT_NAMES = frozenset([
+    'this', 'that', 'these', 'those',  # 代词
+    'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten',  # 数字
+    'one', 'first', 'second', 'third',
+    'heap', 'stack', 'buffer', 'memory',  # 技术词汇
+    'unknown', 'unknown component', 'n/a', 'na',  # 未知
+    '未知', '未知组件',
+])
+# 包含这些词的不是组件名称（如 vulnerability、issue、bug）
+_NON_COMPONENT_KEYWORDS = ('vulnerability', 'issue', 'bug', 'problem', 'error')
+
+# 漏洞危害等级对应的标识
+SEVERITY_EMOJI = {
+    'Critical': '🔴',
+    'High': '🟠',
+    'Medium': '🟡',
+    'Moderate': '🟡',
+    'Low': '🟢',
+    'Important': '🟠'
+}
+
+
+def _json_dumps(data: Any) -> str:
+    """序列化为紧凑 JSON 文本（保留非 ASCII 字符），用于回传给模型的工具结果"""
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # orjson 不支持的类型（如超出 64 位的整数）交给标准库处理
+            pass
+    return json.dumps(data, ensure_ascii=False)
+
+
+@lru_cache(maxsize=1)
+def _get_token_encoder() -> Any:
+    """进程内共享的 tiktoken 编码器；未安装或加载失败时返回 None（回退到按字符数截断）"""
+    if not HAS_TIKTOKEN:
+        return None
+    try:
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        logger.warning(f"加载 tiktoken 编码器失败，对话历史按字符数截断: {e}")
+        return None
+
+
+def _trim_history_by_tokens(conversation_history: List[Dict], encoder: Any, max_tokens: int) -> List[Dict]:
+    """从最新消息往前累计 token 数，只保留预算内的最近消息"""
+    total = 0
+    start = len(conversation_history)
+    for index in range(len(conversation_history) - 1, -1, -1):
+        content = str(conversation_history[index].get('content', ''))
+        total += len(encoder.encode(content, disallowed_special=()))
+        if total > max_tokens:
+            break
+        start = index
+    return conversation_history[start:]
+
+
+def _keywords_re(keywords, flags: int = 0) -> 're.Pattern':
+    """把关键词列表编译为一个字面量多选正则，一次扫描判断是否包含任一关键词"""
+    return re.compile('|'.join(map(re.escape, keywords)), flags)
+
+
+# 意图分析关键词，按类别组织：只需判断消息是否包含某类中的任一关键词
+_INTENT_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    # 安全评估
+    'security': (
+        '安全评估', '渗透测试', '漏洞扫描', '全面评估', '全面的安全评估', '全面安全评估',
+        '安全扫描', '扫描一下', '做一次评估', '做一次扫描', '评估', '扫描'
+    ),
+    # 重新扫描/再次扫描（从对话历史中提取目标）
+    'rescan': ('重新扫描', '再扫描一次', '再次扫描', '再评估', '重新评估', '扫描这个', '再次评估'),
+    # 资产/目标指代
+    'asset_target': ('资产', '服务器', '目标', '对', '云服务器'),
+    # 查询类（介绍、说明、帮助等）
+    'query': (
+        '介绍', '说明', '帮助', 'help', '你是谁', '你能做什么', '你的功能',
+        '你的能力', '你能', '你会', '什么是', '如何', '怎么', '怎样',
+        '列出', '显示', '查看', '查询', '有哪些', '有什么'
+    ),
+    # 漏洞采集
+    'vuln': (
+        '采集漏洞', '收集漏洞', '捕获漏洞', '获取漏洞', '执行漏洞采集', '运行漏洞采集',
+        '最新漏洞', '漏洞信息', '漏洞数据', '漏洞采集', '漏洞收集'
+    ),
+    'vuln_word': ('漏洞',),
+    'vuln_verb': ('捕获', '采集', '收集', '获取', '抓取'),
+    # 资产采集
+    'asset': (
+        '采集资产', '收集资产', '获取资产', '同步资产', '执行资产采集', '运行资产采集',
+        '资产信息', '资产数据', '资产采集', '资产收集'
+    ),
+    'asset_word': ('资产',),
+    'asset_verb': ('采集', '收集', '获取', '同步'),
+    # 漏洞匹配
+    'match': (
+        '匹配漏洞', '检查影响', '检查受影响', '是否受影响', '执行匹配',
+        '影响资产', '受影响', '资产影响', '漏洞影响', '匹配资产'
+    ),
+    'match_subject': ('资产', '影响'),
+    'match_verb': ('检查', '匹配', '是否'),
+    # 创建/设置类与执行类（_extract_actions 据此区分「创建任务」与「执行操作」）
+    'create': ('创建', '设置', '配置', '建立', '添加'),
+    'execute': ('执行', '运行', '开始', '启动', '进行'),
+}
+# 不区分大小写的类别（含英文关键词）；中文关键词没有大小写，直接匹配原始消息，无需先 lower() 复制整条消息
+_CASELESS_CATEGORIES = frozenset(['query'])
+
+# 每个类别编译为一个多选正则（未安装 pyahocorasick 时按需逐类扫描）
+_KEYWORD_RES: Dict[str, 're.Pattern'] = {
+    category: _keywords_re(keywords, re.IGNORECASE if category in _CASELESS_CATEGORIES else 0)
+    for category, keywords in _INTENT_KEYWORDS.items()
+}
+
+
+def _build_keyword_automaton() -> Any:
+    """
+    把区分大小写类别的关键词构建为一个 Aho-Corasick 自动机，每个关键词的值为其所属类别集合
+
+    不区分大小写的类别不放入自动机（枚举大小写组合会随词长指数膨胀），由 _keyword_hits 用正则单独判断。
+    """
+    categories_by_word: Dict[str, set] = {}
+    for category, keywords in _INTENT_KEYWORDS.items():
+        if category in _CASELESS_CATEGORIES:
+            continue
+        for keyword in keywords:
+            categories_by_word.setdefault(keyword, set()).add(category)
+    automaton = ahocorasick.Automaton()
+    for word, categories in categories_by_word.items():
+        automaton.add_word(word, frozenset(categories))
+    automaton.make_automaton()
+    return automaton
+
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton() if HAS_AHOCORASICK else None
+
+
+class _LazyKeywordHits:
+    """未安装 pyahocorasick 时的回退：判断某类别时才用该类别的正则扫描，结果缓存"""
+
+    __slots__ = ('_text', '_hits')
+
+    def __init__(self, text: str):
+        self._text = text
+        self._hits: Dict[str, bool] = {}
+
+    def __contains__(self, category: str) -> bool:
+        hit = self._hits.get(category)
+        if hit is None:
+            hit = self._hits[category] = bool(_KEYWORD_RES[category].search(self._text))
+        return hit
+
+
+def _keyword_hits(text: str):
+    """
+    返回消息命中的关键词类别（支持 `category in hits` 判断）
+
+    有 pyahocorasick 时一次扫描找出区分大小写类别的命中（包括相互重叠的关键词），
+    不区分大小写的类别另用 IGNORECASE 正则判断；否则回退为按需逐类正则匹配。
+    """
+    if _KEYWORD_AUTOMATON is None:
+        return _LazyKeywordHits(text)
+    hits = set()
+    for _, categories in _KEYWORD_AUTOMATON.iter(text):
+        hits |= categories
+    hits.update(category for category in _CASELESS_CATEGORIES if _KEYWORD_RES[category].search(text))
+    return hits
+
+
+@lru_cache(maxsize=512)
+def _is_valid_component_name(component: str) -> bool:
+    """检查组件名称是否有效（同一组件名在漏洞列表中反复出现，结果按名称缓存）"""
+    component_lower = component.strip().lower() if component else ''
+    if not component_lower:
+        return False
+    
+    # 常见编程语言/框架白名单（即使很短也认为是有效的）
+    if component_lower in _VALID_SHORT_NAMES:
+        return True
+    
+    if component_lower in _INVALID_EXACT_NAMES:
+        return False
+    
+    # 无效的组件名称模式
+    if _INVALID_COMPONENT_RE.match(component_lower):
+        return False
+    
+    # 检查是否包含"vulnerability"、"issue"、"bug"等关键词（这些不是组件名称）
+    if any(keyword in component_lower for keyword in _NON_COMPONENT_KEYWORDS):
+        return False
+    
+    return True
+
+
+# 可用操作列表（只读，模块加载后不再修改）
+AVAILABLE_ACTIONS = (
     {
         'name': 'collect_vulnerabilities',
         'description': '采集最新漏洞信息',
@@ -45,10 +306,11 @@ AVAILABLE_ACTIONS = [
             'days': '匹配最近N天的漏洞（默认1天）'
         }
     }
-]
+)
 
 # AI工具函数定义（Function Calling）
-TOOLS = [
+# 使用元组：每次请求直接传同一个只读对象，无需复制，也避免被意外修改
+TOOLS = (
         {
         "type": "function",
         "function": {
@@ -233,12 +495,291 @@ TOOLS = [
             }
         }
     }
-]
+)
+
+
+# 可用操作说明（写入系统提示词）
+_ACTIONS_DESC = "\n".join([
+    f"- {action['name']}: {action['description']}"
+    for action in AVAILABLE_ACTIONS
+])
+
+
+# 启用插件列表（系统提示词用）的进程内缓存：(过期时间, 插件描述)
+_plugins_desc_cache: Tuple[float, Optional[str]] = (0.0, None)
+
+
+def _get_plugins_desc() -> str:
+    """返回启用插件的描述列表，PLUGINS_DESC_TTL 内复用，避免每轮对话都查询数据库"""
+    global _plugins_desc_cache
+    expires_at, plugins_desc = _plugins_desc_cache
+    now = time.monotonic()
+    if plugins_desc is None or now >= expires_at:
+        # 只取展示需要的字段，按名称排序保证提示词文本稳定（便于模型服务端的前缀缓存命中）
+        plugins = Plugin.objects.filter(is_active=True).only('name', 'plugin_type').order_by('name')
+        plugins_desc = "\n".join([
+            f"- {p.name} ({p.get_plugin_type_display()})"
+            for p in plugins
+        ])
+        _plugins_desc_cache = (now + PLUGINS_DESC_TTL, plugins_desc)
+    return plugins_desc
+
+
+# 系统提示词的静态部分（说明与可用操作，模块加载时拼好一次）；
+# 随插件启停变化的插件列表放在最后，保证前缀字节稳定，便于模型服务端的前缀缓存命中
+_SYSTEM_PROMPT_STATIC = f"""你是一个专业的安全运营(SecOps)智能助手，可以帮助用户执行安全运营任务和配置管理任务。
+
+可用操作：
+{_ACTIONS_DESC}
+
+你的能力：
+1. 理解用户的安全运营需求
+2. 回答用户的问题和提供帮助（介绍、说明、查询等）
+3. 自动执行相应的任务（漏洞采集、资产采集、漏洞匹配等）- **仅在用户明确要求时执行**
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+
+4. 创建和管理定时任务（支持cron表达式和自然语言）
+5. 分析和解释执行结果
+6. 提供专业的安全建议
+7. **资产安全评估（HexStrike AI 集成）**：当用户要求对资产做安全评估、渗透测试或漏洞扫描时：
+   - 可先使用 list_assets 查询资产列表，获取要评估的目标（IP/域名/主机名）
+   - 使用 hexstrike_analyze_target(target) 对指定目标进行综合安全分析（由 HexStrike 智能选择扫描策略）
+   - 或使用 hexstrike_run_scan(tool_name, arguments) 执行指定工具（如 nmap_scan、nuclei_scan 等）
+   - 仅对用户拥有或明确授权的资产进行评估，并提醒用户确保已获得授权
+
+重要提示：
+- **当用户询问"介绍"、"说明"、"帮助"、"你是谁"、"你能做什么"等问题时，只回答，不要执行任何操作**
+- **只有在用户明确要求执行任务时（如"请执行漏洞采集"、"开始匹配"、"运行资产采集"等），才执行操作**
+- **不要因为响应中提到了操作名称就执行，必须用户明确要求执行**
+
+任务创建说明：
+- **重要**：只有插件相关的操作才能创建为定时任务。系统操作（如match_vulnerabilities）不能创建为定时任务。
+- 可创建定时任务的操作：
+  * collect_vulnerabilities（漏洞采集）- 使用插件：collect_oss_security
+  * collect_assets（资产采集）- 使用插件：data_aliyun_security
+- **不能创建定时任务的操作**：
+  * match_vulnerabilities（漏洞匹配）- 这是系统操作，不是插件，不能创建为定时任务
+  * 如果用户要求为match_vulnerabilities创建定时任务，应该说明这是系统操作，无法创建定时任务，但可以在漏洞采集和资产采集任务执行后自动执行匹配
+- 当用户要求创建定时任务时，使用create_task工具函数
+- cron表达式格式：分钟 小时 日 月 周（5个字段，用空格分隔）
+  * 示例：'0 0 * * *' 表示每天0点执行
+  * 示例：'0 */6 * * *' 表示每6小时执行一次（注意：*/6表示每6小时，不是/6）
+  * 示例：'0 0 * * 1' 表示每周一0点执行
+- 支持自然语言转换为cron表达式（使用parse_cron工具函数）：
+  * "每天0点" -> "0 0 * * *"
+  * "每小时" -> "0 * * * *"
+  * "每6小时" -> "0 */6 * * *"（注意：*/6，不是/6）
+  * "每周一0点" -> "0 0 * * 1"
+- 插件关键词匹配：
+  * "漏洞采集"、"CVE"、"oss-security"、"collect_oss_security" -> collect_oss_security插件
+  * "资产采集"、"asset"、"data_aliyun_security" -> data_aliyun_security插件
+- 创建任务时的注意事项：
+  * 如果用户要求创建多个任务的定时任务，应该为每个可创建的操作分别创建任务
+  * 如果用户要求为match_vulnerabilities创建定时任务，应该说明无法创建，但可以建议在漏洞采集和资产采集任务执行后，系统会自动执行匹配
+  * 创建任务成功后，只返回任务创建结果，不要执行操作
+
+**操作执行说明**：
+- `collect_vulnerabilities`、`collect_assets`、`match_vulnerabilities` 是**操作**，不是工具函数
+- 这些操作**不能**通过Function Calling调用，它们不在TOOLS列表中
+- 当用户要求执行这些操作时（如"捕获漏洞"、"检查资产"等），系统会自动通过意图分析来触发执行
+- **绝对不要**尝试调用这些操作作为工具函数，如果AI尝试调用，系统会自动回退到操作执行方式
+
+工作流程：
+1. 理解用户的意图
+2. 如果是查询类消息（介绍、说明、帮助等），只回答，不执行任何操作
+3. 如果需要创建或修改任务，使用相应的工具函数（create_task、update_task、list_tasks）
+4. 如果用户明确要求执行操作（如"捕获漏洞"、"检查资产"等），系统会自动通过意图分析来执行，不需要调用工具函数
+5. 如果用户要求对资产做安全评估、渗透测试或漏洞扫描，使用 list_assets 获取目标，再使用 hexstrike_analyze_target 或 hexstrike_run_scan（需 HexStrike 服务已启动）
+6. 执行操作后，分析和总结结果
+
+请用友好、专业的语气回复用户。"""
+
+
+def _plugins_prompt(plugins_desc: str) -> str:
+    """系统提示词末尾的可用插件段落"""
+    return f"\n\n可用插件：\n{plugins_desc}"
+
+
+@lru_cache(maxsize=4)
+def _render_system_prompt(plugins_desc: str) -> str:
+    """渲染系统提示词；插件列表不变时直接复用已拼好的字符串"""
+    return _SYSTEM_PROMPT_STATIC + _plugins_prompt(plugins_desc)
 
 
 class SecOpsAgent:
     """SecOps智能体"""
 
+    # 操作名 -> 处理方法名（与 AVAILABLE_ACTIONS 一一对应）
+    _ACTION_HANDLERS = {
+        'collect_vulnerabilities': '_collect_vulnerabilities',
+        'match_vulnerabilities': '_match_vulnerabilities',
+        'collect_assets': '_collect_assets',
+    }
+
     def __init__(self, api_key: str, api_base: str = 'https://dashscope.aliyuncs.com/compatible-mode/v1',
                  model: str = 'qwen-plus'):
         """
@@ -252,40 +793,32 @@ class SecOpsAgent:
         self.api_key = api_key
         self.api_base = api_base
         self.model = model
-        self.client = None
 
-        # 创建时尝试导入 openai；若未安装则用当前进程的 Python 自动安装后重试
+    @cached_property
+    def client(self):
+        """OpenAI 兼容客户端（首次调用模型时才导入 openai 并创建）"""
         try:
             import openai
-        except ImportError:
-            logger.warning("openai 未安装，尝试使用当前 Python 自动安装: %s", sys.executable)
-            try:
-                subprocess.run(
-                    [sys.executable, '-m', 'pip', 'install', 'openai', '--quiet'],
-                    capture_output=True,
-                    timeout=120,
-                    check=False,
-                )
-                import openai
-            except Exception as e:
-                logger.exception("自动安装 openai 失败: %s", e)
-                raise ImportError(
-                    "openai 库未安装。请使用【运行本应用的同一 Python 环境】执行: pip install openai\n"
-                    "若使用虚拟环境，请先激活再安装；或执行: pip install -r requirements.txt"
-                ) from e
+        except ImportError as e:
+            raise ImportError(
+                "openai 库未安装。请使用【运行本应用的同一 Python 环境】执行: pip install openai\n"
+                "若使用虚拟环境，请先激活再安装；或执行: pip install -r requirements.txt"
+            ) from e
         # 设置超时时间为5分钟，避免长时间等待
-        self.client = openai.OpenAI(
-            api_key=api_key,
-            base_url=api_base,
+        return openai.OpenAI(
+            api_key=self.api_key,
+            base_url=self.api_base,
             timeout=300.0,  # 5分钟超时
         )
 
-        # 初始化统一对话服务
+    @cached_property
+    def conversation_service(self):
+        """统一对话服务（首次使用时创建）"""
         from app.services.secops_conversation import SecOpsConversationService
-        self.conversation_service = SecOpsConversationService(
-            api_key=api_key,
-            api_base=api_base,
-            model=model
+        return SecOpsConversationService(
+            api_key=self.api_key,
+            api_base=self.api_base,
+            model=self.model
         )
     
     def chat(self, user_message: str, conversation_history: Optional[List[Dict]] = None, 
@@ -302,75 +835,23 @@ class SecOpsAgent:
             str: 响应文本片段
         """
         # 限制消息长度（最大20000字符，提升以支持更长的对话）
-        MAX_MESSAGE_LENGTH = 20000
         if len(user_message) > MAX_MESSAGE_LENGTH:
             yield f"❌ 消息过长，请控制在{MAX_MESSAGE_LENGTH}字符以内\n"
             return
         
-        # 限制对话历史长度
-        if conversation_history:
-            # 限制历史记录总长度和数量（提升到50000字符，约支持20轮对话）
-            MAX_HISTORY_LENGTH = MAX_MESSAGE_LENGTH * 2.5  # 50000字符
-            total_length = sum(len(str(msg.get('content', ''))) for msg in conversation_history)
-            if total_length > MAX_HISTORY_LENGTH:
-                # 只保留最近的消息（提升到10条消息，约5轮对话）
-                conversation_history = conversation_history[-10:]
-                logger.warning(f"对话历史过长，已截断为最近10条消息")
-        
-        # 构建系统提示词
-        system_prompt = self._build_system_prompt()
-        
-        # 构建对话消息
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # 添加历史对话（提升到20轮对话，40条消息）
-        if conversation_history:
-            messages.extend(conversation_history[-40:])  # 只保留最近40条消息（约20轮对话）
-        
-        # 添加当前用户消息
-        messages.append({"role": "user", "content": user_message})
-        
-        # 先分析用户意图，判断是否需要执行操作（使用统一对话服务）
-        intent_obj = self.conversation_service.analyze_intent(user_message, conversation_history)
-        intent_analysis = {
-            'needs_vulnerability_collection': intent_obj.needs_vulnerability_collection,
-            'needs_asset_collection': intent_obj.needs_asset_collection,
-            'needs_matching': intent_obj.needs_matching,
-            'needs_hexstrike_assessment': intent_obj.needs_hexstrike_assessment,
-            'hexstrike_target': intent_obj.hexstrike_target,
-            'days': intent_obj.days,
-            'is_query': intent_obj.is_query,
-        }
-        needs_hexstrike = intent_obj.needs_hexstrike_assessment
-        hexstrike_target = intent_obj.hexstrike_target
-        logger.info(
-            "SecOps 意图分析: needs_hexstrike=%s, hexstrike_target=%s, is_query=%s, user_message_len=%d, user_message_preview=%s",
-            needs_hexstrike,
-            hexstrike_target,
-            intent_obj.is_query,
-            len(user_message or ''),
-            (user_message or '')[:100],
-        )
+        conversation_history, intent_analysis = self._prepare_turn(user_message, conversation_history)
 
         # 当用户明确要求对某目标做安全评估且已从消息中提取到目标时，直接调用 HexStrike，不依赖模型是否返回 tool_call
         # 重要：即使有对话历史，也强制执行新扫描，不使用历史结果
-        if needs_hexstrike and hexstrike_target:
-            target = hexstrike_target
+        if intent_analysis['needs_hexstrike_assessment'] and intent_analysis['hexstrike_target']:
+            target = intent_analysis['hexstrike_target']
             logger.info("✓ 检测到安全评估意图且已提取目标，直接调用 HexStrike: target=%s", target)
             try:
-                # 获取用户 ID
-                user_id = None
-                if user:
-                    if hasattr(user, 'username'):
-                        user_id = user.username
-                    elif isinstance(user, str):
-                        user_id = user
-
                 # 使用统一对话服务调用 HexStrike
                 tool_result = self.conversation_service.call_hexstrike_analyze(
                     target=target,
                     analysis_type='comprehensive',
-                    user_id=user_id
+                    user_id=self._user_id(user)
                 )
 
                 # 使用统一对话服务格式化响应（流式）
@@ -383,98 +864,51 @@ class SecOpsAgent:
                 logger.error(f"调用 HexStrike 失败: {e}", exc_info=True)
                 yield f"### ❌ HexStrike 调用异常: {str(e)}\n\n"
             return
-        elif needs_hexstrike and not hexstrike_target:
-            logger.warning("检测到安全评估意图但未提取到目标，继续执行 AI 调用: user_message=%s", user_message[:100])
-        else:
-            logger.debug("未检测到安全评估意图，继续执行 AI 调用")
+        
+        messages = self._build_messages(user_message, conversation_history)
         
         # 调用模型，支持Function Calling
         try:
             # 第一轮调用：可能包含工具调用
-            # 设置max_tokens以充分利用模型上下文窗口（qwen-plus支持8192 tokens）
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.3,
-                tools=TOOLS,
-                tool_choice="auto",  # 让AI自动决定是否调用工具
-                max_tokens=4000  # 设置最大输出token数，留出足够空间给输入
-            )
+            stream = self.client.chat.completions.create(**self._completion_kwargs(messages, with_tools=True))
             
-            full_response = ""
-            tool_calls = []
-            
-            # 处理响应
-            message = response.choices[0].message
-            
-            # 准备助手的回复
-            assistant_message = {
-                "role": "assistant",
-                "content": message.content or None
-            }
+            # 回复文本片段先收集到列表，流结束后一次拼接
+            response_parts = []
+            # 按 index 累积流式返回的工具调用片段：{index: {id, name, arguments}}
+            tool_call_parts = {}
             
-            # 如果有工具调用，添加到消息中
-            if message.tool_calls:
-                assistant_message["tool_calls"] = [
-                    {
-                        "id": tc.id,
-                        "type": tc.type,
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments
-                        }
-                    } for tc in message.tool_calls
-                ]
+            # 处理流式响应：文本内容到达即输出，工具调用参数分片拼接
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                self._merge_tool_call_deltas(tool_call_parts, delta)
+                if delta.content:
+                    if not response_parts and not tool_call_parts:
+                        # 先输出思考过程标记（灰色小字）
+                        yield THINKING_MARKER
+                    response_parts.append(delta.content)
+                    yield delta.content
+            full_response = "".join(response_parts)
             
-            # 添加助手的回复到消息历史
-            messages.append(assistant_message)
+            tool_calls = self._assemble_tool_calls(tool_call_parts, full_response, messages)
             
             # 处理工具调用
-            if message.tool_calls:
+            if tool_calls:
                 # 不输出执行过程信息
                 has_valid_tool = False
                 has_unknown_tool = False
                 
-                for tool_call in message.tool_calls:
-                    function_name = tool_call.function.name
-                    
-                    # 安全解析JSON参数
-                    try:
-                        function_args = json.loads(tool_call.function.arguments)
-                    except json.JSONDecodeError as e:
-                        logger.error(f"解析工具函数参数失败: {e}, function={function_name}, arguments={tool_call.function.arguments[:100]}")
-                        yield f"### ❌ 工具函数参数格式错误\n\n"
+                # 调用工具函数（多个工具调用并发执行），按调用顺序处理结果
+                for tool_call, error_chunk, tool_result in self._run_tool_calls(tool_calls, user):
+                    if error_chunk:
+                        yield error_chunk
                         continue
-                    except Exception as e:
-                        logger.error(f"解析工具函数参数异常: {e}, function={function_name}", exc_info=True)
-                        yield f"### ❌ 处理工具函数参数时发生错误\n\n"
-                        continue
-                    
-                    # 调用工具函数
-                    tool_result = self._call_tool(function_name, function_args, user)
-                    
-                    # 将工具结果添加到消息历史
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": json.dumps(tool_result, ensure_ascii=False)
-                    })
                     
-                    # 输出工具执行结果
-                    if tool_result.get('success'):
-                        has_valid_tool = True
-                        yield f"### ✅ {tool_result.get('message', '操作成功')}\n\n"
-                        if 'task_id' in tool_result:
-                            yield f"**任务ID**: {tool_result['task_id']}\n\n"
-                    else:
-                        # 检查是否是未知工具（这些应该是操作，不是工具）
-                        if '未知的工具函数' in tool_result.get('message', ''):
-                            has_unknown_tool = True
-                            logger.warning(f"AI尝试调用未知工具: {function_name}，这应该是操作而不是工具，将自动回退到操作执行方式")
-                            # 不输出错误消息，因为系统会自动回退到操作执行方式
-                        else:
-                            # 只有真正的错误才输出
-                            yield f"### ❌ {tool_result.get('message', '操作失败')}\n\n"
+                    chunks, is_valid, is_unknown = self._handle_tool_result(tool_call, tool_result, messages)
+                    has_valid_tool |= is_valid
+                    has_unknown_tool |= is_unknown
+                    yield from chunks
                 
                 # 如果有未知工具调用（如collect_vulnerabilities等），说明AI误解了
                 # 这些应该是操作，不是工具，需要回退到操作执行方式
@@ -482,30 +916,17 @@ class SecOpsAgent:
                     logger.info("检测到未知工具调用，回退到操作执行方式")
                     # 不进行第二轮AI调用，直接执行操作
                     if not intent_analysis.get('is_query', False):
-                        actions = self._extract_actions("", intent_analysis, user_message)
-                        if actions:
-                            # 不输出执行过程，只输出结果
-                            for i, action in enumerate(actions, 1):
-                                yield from self._execute_action(action, user)
-                                if i < len(actions):
-                                    yield "\n"
+                        yield from self._run_actions(self._extract_actions("", intent_analysis, user_message), user)
                     return
                 
                 # 第二轮调用：让AI根据工具结果生成回复
-                response2 = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=0.3,
-                    stream=True,
-                    max_tokens=4000  # 设置最大输出token数
-                )
+                response2 = self.client.chat.completions.create(**self._completion_kwargs(messages))
                 
                 yield "\n"
+                # 第二轮回复之后不再使用完整文本，只需流式输出
                 for chunk in response2:
                     if chunk.choices and chunk.choices[0].delta.content:
-                        content = chunk.choices[0].delta.content
-                        full_response += content
-                        yield content
+                        yield chunk.choices[0].delta.content
                 
                 # 如果已经使用了有效的工具函数（如create_task），就不应该再执行操作
                 # 创建任务和执行操作是两回事，不应该同时进行
@@ -513,130 +934,295 @@ class SecOpsAgent:
                 if has_valid_tool:
                     return
             else:
-                # 没有工具调用
-                # 如果有内容，先输出思考过程（灰色小字）
-                if message.content:
-                    # 先输出思考过程标记
-                    yield json.dumps({
-                        "type": "thinking",
-                        "content": "正在思考...",
-                        "expandable": True
-                    })
-                    # 然后输出实际内容
-                    full_response += message.content
-                    yield message.content
-                
-                # 如果没有内容，使用流式输出（这种情况应该很少）
-                if not message.content:
-                    stream = self.client.chat.completions.create(
-                        model=self.model,
-                        messages=messages,
-                        temperature=0.3,
-                        stream=True,
-                        max_tokens=4000  # 设置最大输出token数
-                    )
+                # 没有工具调用（文本内容已在流式处理时输出）
+                # 如果没有内容，再发起一次流式调用（这种情况应该很少）
+                if not full_response:
+                    stream = self.client.chat.completions.create(**self._completion_kwargs(messages))
                     
                     for chunk in stream:
                         if chunk.choices and chunk.choices[0].delta.content:
                             content = chunk.choices[0].delta.content
-                            full_response += content
+                            response_parts.append(content)
                             yield content
+                    full_response = "".join(response_parts)
                 
                 # 分析响应，判断是否需要执行操作（非工具操作）
                 # 只有在没有工具调用的情况下才检查actions
                 # 但如果是查询类消息，不执行任何操作
                 if not intent_analysis.get('is_query', False):
-                    actions = self._extract_actions(full_response, intent_analysis, user_message)
-                    if actions:
-                        # 不输出执行过程，只输出结果
-                        for i, action in enumerate(actions, 1):
-                            yield from self._execute_action(action, user)
-                            if i < len(actions):
-                                yield "\n"
+                    yield from self._run_actions(
+                        self._extract_actions(full_response, intent_analysis, user_message), user
+                    )
             
         except Exception as e:
             logger.error(f"智能体对话失败: {e}", exc_info=True)
-            
-            # 检查是否是API错误，提供更友好的错误信息
-            error_str = str(e)
-            error_msg = "❌ 发生错误: "
-            
-            # 检查是否是账户欠费错误
-            if 'Arrearage' in error_str or 'overdue-payment' in error_str or '账户欠费' in error_str:
-                error_msg = "❌ 通义千问API账户欠费，请前往阿里云充值后再试。\n"
-                error_msg += "   详情: https://help.aliyun.com/zh/model-studio/error-code#overdue-payment\n"
-            # 检查是否是API密钥错误
-            elif 'invalid_api_key' in error_str or 'Invalid API Key' in error_str or 'API Key' in error_str:
-                error_msg = "❌ 通义千问API Key无效，请检查系统配置中的API Key是否正确。\n"
-            # 检查是否是API连接错误
-            elif 'Connection' in error_str or 'timeout' in error_str.lower():
-                error_msg = "❌ 无法连接到通义千问API，请检查网络连接。\n"
-            else:
-                error_msg += f"{error_str}\n"
-            
-            yield error_msg
+            yield self._chat_error_message(e)
     
-    def _is_valid_component_name(self, component: str) -> bool:
+    def _prepare_turn(self, user_message: str,
+                      conversation_history: Optional[List[Dict]]) -> Tuple[Optional[List[Dict]], Dict[str, Any]]:
         """
-        检查组件名称是否有效
-        
-        Args:
-            component: 组件名称
-            
+        分析用户意图并截断对话历史
+
         Returns:
-            bool: 如果组件名称有效返回True，否则返回False
+            Tuple: (截断后的对话历史, 意图分析结果)
         """
-        if not component or not component.strip():
-            return False
+        # 先分析用户意图，判断是否需要执行操作
+        # 本地关键词/正则分析（与统一对话服务的规则一致），在构建提示词、创建任何客户端之前完成
+        # 使用截断前的完整历史，避免按 token 截断后丢失较早轮次中的目标信息
+        intent_analysis = self._analyze_intent(user_message, conversation_history)
         
-        component_lower = component.lower().strip()
+        # 限制对话历史长度（只影响发送给模型的上下文）
+        if conversation_history:
+            encoder = _get_token_encoder()
+            if encoder is not None:
+                # 按 token 数截断：从最新消息往前保留，直到超出预算
+                trimmed = _trim_history_by_tokens(conversation_history, encoder, MAX_HISTORY_TOKENS)
+                if len(trimmed) < len(conversation_history):
+                    logger.warning(
+                        f"对话历史超过 {MAX_HISTORY_TOKENS} tokens，已截断为最近{len(trimmed)}条消息"
+                    )
+                conversation_history = trimmed
+            else:
+                # 限制历史记录总长度和数量（提升到50000字符，约支持20轮对话）
+                MAX_HISTORY_LENGTH = MAX_MESSAGE_LENGTH * 2.5  # 50000字符
+                total_length = sum(len(str(msg.get('content', ''))) for msg in conversation_history)
+                if total_length > MAX_HISTORY_LENGTH:
+                    # 只保留最近的消息（提升到10条消息，约5轮对话）
+                    conversation_history = conversation_history[-10:]
+                    logger.warning(f"对话历史过长，已截断为最近10条消息")
+
+        needs_hexstrike = intent_analysis['needs_hexstrike_assessment']
+        hexstrike_target = intent_analysis['hexstrike_target']
+        logger.info(
+            "SecOps 意图分析: needs_hexstrike=%s, hexstrike_target=%s, is_query=%s, user_message_len=%d, user_message_preview=%s",
+            needs_hexstrike,
+            hexstrike_target,
+            intent_analysis['is_query'],
+            len(user_message or ''),
+            (user_message or '')[:100],
+        )
+        if needs_hexstrike and not hexstrike_target:
+            logger.warning("检测到安全评估意图但未提取到目标，继续执行 AI 调用: user_message=%s", user_message[:100])
+        elif not needs_hexstrike:
+            logger.debug("未检测到安全评估意图，继续执行 AI 调用")
         
-        # 常见编程语言/框架白名单（即使很短也认为是有效的）
-        valid_short_names = [
-            'go', 'golang', 'python', 'java', 'nodejs', 'node.js', 'rust', 'php', 'ruby',
-            'c', 'cpp', 'c++', 'c#', 'js', 'ts', 'tsx', 'jsx', 'html', 'css', 'sql',
-            'curl', 'wget', 'git', 'vim', 'emacs', 'bash', 'zsh', 'sh'
-        ]
+        return conversation_history, intent_analysis
+    
+    @staticmethod
+    def _user_id(user) -> Optional[str]:
+        """从用户对象或用户名中取得用户 ID"""
+        if user:
+            if hasattr(user, 'username'):
+                return user.username
+            elif isinstance(user, str):
+                return user
+        return None
+    
+    def _build_messages(self, user_message: str, conversation_history: Optional[List[Dict]]) -> List[Dict]:
+        """构建发给模型的对话消息：系统提示词 + 最近的历史 + 当前用户消息"""
+        # 构建系统提示词
+        if getattr(settings, 'QWEN_PROMPT_CACHE_CONTROL', False):
+            # 静态部分单独成段并标记显式缓存，插件列表变化不影响其缓存命中
+            system_content = [
+                {"type": "text", "text": _SYSTEM_PROMPT_STATIC, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": _plugins_prompt(_get_plugins_desc())},
+            ]
+        else:
+            system_content = self._build_system_prompt()
         
-        if component_lower in valid_short_names:
-            return True
+        # 构建对话消息
+        messages = [{"role": "system", "content": system_content}]
         
-        # 无效的组件名称列表
-        invalid_exact = [
-            'this', 'that', 'these', 'those',  # 代词
-            'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten',  # 数字
-            'one', 'first', 'second', 'third',
-            'heap', 'stack', 'buffer', 'memory',  # 技术词汇
-            'unknown', 'unknown component', 'n/a', 'na',  # 未知
-            '未知', '未知组件',
+        # 添加历史对话（提升到20轮对话，40条消息）
+        if conversation_history:
+            messages.extend(conversation_history[-40:])  # 只保留最近40条消息（约20轮对话）
+        
+        # 添加当前用户消息
+        messages.append({"role": "user", "content": user_message})
+        return messages
+    
+    def _completion_kwargs(self, messages: List[Dict], with_tools: bool = False) -> Dict[str, Any]:
+        """流式 chat.completions.create 的调用参数"""
+        kwargs = {
+            'model': self.model,
+            'messages': messages,
+            'temperature': 0.3,
+            'stream': True,
+            # 设置max_tokens以充分利用模型上下文窗口（qwen-plus支持8192 tokens），留出足够空间给输入
+            'max_tokens': 4000,
+        }
+        if with_tools:
+            kwargs['tools'] = TOOLS
+            kwargs['tool_choice'] = "auto"  # 让AI自动决定是否调用工具
+        return kwargs
+    
+    @staticmethod
+    def _merge_tool_call_deltas(tool_call_parts: Dict[int, Dict[str, Any]], delta) -> None:
+        """把流式返回的工具调用片段按 index 拼接到 tool_call_parts"""
+        for tc in delta.tool_calls or ():
+            part = tool_call_parts.setdefault(tc.index, {'id': None, 'name': '', 'arguments': ''})
+            if tc.id:
+                part['id'] = tc.id
+            if tc.function:
+                if tc.function.name:
+                    part['name'] += tc.function.name
+                if tc.function.arguments:
+                    part['arguments'] += tc.function.arguments
+    
+    @staticmethod
+    def _assemble_tool_calls(tool_call_parts: Dict[int, Dict[str, Any]], full_response: str,
+                             messages: List[Dict]) -> List[Dict[str, Any]]:
+        """组装完整的工具调用列表，并把助手回复追加到消息历史"""
+        tool_calls = [
+            {
+                "id": part['id'],
+                "type": "function",
+                "function": {
+                    "name": part['name'],
+                    "arguments": part['arguments']
+                }
+            } for _, part in sorted(tool_call_parts.items())
         ]
         
-        if component_lower in invalid_exact:
-            return False
+        # 准备助手的回复
+        assistant_message = {
+            "role": "assistant",
+            "content": full_response or None
+        }
+        
+        # 如果有工具调用，添加到消息中
+        if tool_calls:
+            assistant_message["tool_calls"] = tool_calls
         
-        # 无效的组件名称模式
-        import re
-        invalid_patterns = [
-            r'^(two|three|four|five|six|seven|eight|nine|ten)\s+',  # 数字开头的描述（如"two heap"）
-            r'^(xxe|xss|csrf|sql\s*injection|rce|rfi|lfi)',  # 漏洞类型
-            r'^(before|after|through|to|until|up\s+to|from)\s+',  # 版本范围关键词（必须后面跟内容）
-            r'^[<>=]+\s*\d+',  # 版本比较符
-            r'^\d+\.\d+',  # 版本号开头
-            # 修复：只匹配真正的版本范围字符串（包含数字和版本关键词的组合）
-            r'^(before|after|through|to|until|up\s+to|from)\s+\d+',  # "before 2.2.1" 等
-            r'^\d+\s+(before|after|through|to|until|up\s+to|from)\s+\d+',  # "2.0.0 before 2.2.1" 等
-            r'^[\d\s<>=]+$',  # 只包含数字、空格、比较符（不包含字母，避免误判"go"等）
+        # 添加助手的回复到消息历史
+        messages.append(assistant_message)
+        return tool_calls
+    
+    @staticmethod
+    def _parse_tool_arguments(tool_call: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        安全解析工具调用的 JSON 参数
+
+        Returns:
+            Tuple: (参数字典, 错误提示片段)；解析失败时参数为 None
+        """
+        function_name = tool_call['function']['name']
+        try:
+            return json_loads(tool_call['function']['arguments']), None
+        except json.JSONDecodeError as e:
+            logger.error(f"解析工具函数参数失败: {e}, function={function_name}, arguments={tool_call['function']['arguments'][:100]}")
+            return None, f"### ❌ 工具函数参数格式错误\n\n"
+        except Exception as e:
+            logger.error(f"解析工具函数参数异常: {e}, function={function_name}", exc_info=True)
+            return None, f"### ❌ 处理工具函数参数时发生错误\n\n"
+    
+    def _run_tool_calls(self, tool_calls: List[Dict[str, Any]],
+                        user=None) -> List[Tuple[Dict[str, Any], Optional[str], Optional[Dict[str, Any]]]]:
+        """
+        解析参数并执行本轮全部工具调用
+
+        模型在同一轮返回的多个工具调用彼此独立，多于一个时放到线程池并发执行，
+        总耗时取决于最慢的一个；结果仍按调用顺序返回。
+
+        Returns:
+            List: [(工具调用, 参数错误提示片段, 工具结果)]；参数解析失败时工具结果为 None
+        """
+        parsed = [(tool_call, *self._parse_tool_arguments(tool_call)) for tool_call in tool_calls]
+        pending = [
+            (tool_call['function']['name'], function_args)
+            for tool_call, function_args, error_chunk in parsed if not error_chunk
         ]
+        if len(pending) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(pending), MAX_TOOL_WORKERS)) as executor:
+                results = list(executor.map(lambda item: self._call_tool_in_thread(item[0], item[1], user), pending))
+        else:
+            results = [self._call_tool(function_name, function_args, user) for function_name, function_args in pending]
         
-        for pattern in invalid_patterns:
-            if re.match(pattern, component_lower, re.IGNORECASE):
-                return False
+        results_iter = iter(results)
+        return [
+            (tool_call, error_chunk, None if error_chunk else next(results_iter))
+            for tool_call, function_args, error_chunk in parsed
+        ]
+    
+    def _call_tool_in_thread(self, function_name: str, function_args: Dict[str, Any],
+                             user=None) -> Dict[str, Any]:
+        """在线程池工作线程中执行工具调用，结束后关闭该线程打开的数据库连接（Django 连接按线程持有）"""
+        try:
+            return self._call_tool(function_name, function_args, user)
+        finally:
+            connections.close_all()
+    
+    @staticmethod
+    def _handle_tool_result(tool_call: Dict[str, Any], tool_result: Dict[str, Any],
+                            messages: List[Dict]) -> Tuple[List[str], bool, bool]:
+        """
+        把工具结果追加到消息历史，并生成要输出的结果片段
+
+        Returns:
+            Tuple: (输出片段列表, 是否为有效工具调用, 是否为未知工具)
+        """
+        # 将工具结果添加到消息历史
+        messages.append({
+            "role": "tool",
+            "tool_call_id": tool_call['id'],
+            "content": _json_dumps(tool_result)
+        })
         
-        # 检查是否包含"vulnerability"、"issue"、"bug"等关键词（这些不是组件名称）
-        if any(keyword in component_lower for keyword in ['vulnerability', 'issue', 'bug', 'problem', 'error']):
-            return False
+        # 输出工具执行结果
+        if tool_result.get('success'):
+            chunks = [f"### ✅ {tool_result.get('message', '操作成功')}\n\n"]
+            if 'task_id' in tool_result:
+                chunks.append(f"**任务ID**: {tool_result['task_id']}\n\n")
+            return chunks, True, False
+        # 检查是否是未知工具（这些应该是操作，不是工具）
+        if '未知的工具函数' in tool_result.get('message', ''):
+            logger.warning(f"AI尝试调用未知工具: {tool_call['function']['name']}，这应该是操作而不是工具，将自动回退到操作执行方式")
+            # 不输出错误消息，因为系统会自动回退到操作执行方式
+            return [], False, True
+        # 只有真正的错误才输出
+        return [f"### ❌ {tool_result.get('message', '操作失败')}\n\n"], False, False
+    
+    def _run_actions(self, actions: List[Dict[str, Any]], user=None) -> Generator[str, None, None]:
+        """依次执行操作（不输出执行过程，只输出结果），操作之间空一行"""
+        for i, action in enumerate(actions, 1):
+            yield from self._execute_action(action, user)
+            if i < len(actions):
+                yield "\n"
+    
+    @staticmethod
+    def _chat_error_message(e: Exception) -> str:
+        """把模型调用异常转换为更友好的错误信息"""
+        # 检查是否是API错误，提供更友好的错误信息
+        error_str = str(e)
+        error_msg = "❌ 发生错误: "
         
-        return True
+        # 检查是否是账户欠费错误
+        if 'Arrearage' in error_str or 'overdue-payment' in error_str or '账户欠费' in error_str:
+            error_msg = "❌ 通义千问API账户欠费，请前往阿里云充值后再试。\n"
+            error_msg += "   详情: https://help.aliyun.com/zh/model-studio/error-code#overdue-payment\n"
+        # 检查是否是API密钥错误
+        elif 'invalid_api_key' in error_str or 'Invalid API Key' in error_str or 'API Key' in error_str:
+            error_msg = "❌ 通义千问API Key无效，请检查系统配置中的API Key是否正确。\n"
+        # 检查是否是API连接错误
+        elif 'Connection' in error_str or 'timeout' in error_str.lower():
+            error_msg = "❌ 无法连接到通义千问API，请检查网络连接。\n"
+        else:
+            error_msg += f"{error_str}\n"
+        
+        return error_msg
+    
+    @staticmethod
+    def _is_valid_component_name(component: str) -> bool:
+        """
+        检查组件名称是否有效
+        
+        Args:
+            component: 组件名称
+            
+        Returns:
+            bool: 如果组件名称有效返回True，否则返回False
+        """
+        return _is_valid_component_name(component)
     
     def _analyze_intent(self, user_message: str, conversation_history: List[Dict] = None) -> Dict[str, Any]:
         """
@@ -649,7 +1235,6 @@ class SecOpsAgent:
         Returns:
             Dict: 意图分析结果
         """
-        message_lower = user_message.lower()
         intent = {
             'needs_vulnerability_collection': False,
             'needs_asset_collection': False,
@@ -660,58 +1245,38 @@ class SecOpsAgent:
             'is_query': False  # 是否是查询类消息（介绍、说明、帮助等）
         }
 
+        # 各类关键词的命中情况（有 pyahocorasick 时一次扫描得出）
+        hits = _keyword_hits(user_message)
+
+        # 查询类消息（介绍、说明、帮助等）
+        is_query_message = 'query' in hits
+
         # 先识别「安全评估」类意图并提取目标（优先于 is_query，避免被误判为仅查询）
-        security_assessment_keywords = [
-            '安全评估', '渗透测试', '漏洞扫描', '全面评估', '全面的安全评估', '全面安全评估',
-            '安全扫描', '扫描一下', '做一次评估', '做一次扫描', '评估', '扫描'
-        ]
+        has_security_keyword = 'security' in hits
 
-        # 重新扫描/再次扫描的关键词（从对话历史中提取目标）
-        rescan_keywords = ['重新扫描', '再扫描一次', '再次扫描', '再评估', '重新评估', '扫描这个', '再次评估']
+        # 增强匹配：如果消息中包含IP/域名，且包含"资产"、"服务器"、"目标"、"对"等关键词，也视为安全评估意图
+        has_asset_keyword = 'asset_target' in hits
 
-        has_security_keyword = any(kw in user_message for kw in security_assessment_keywords)
-        has_rescan_keyword = any(kw in user_message for kw in rescan_keywords)
+        # 既无评估/扫描类词（重新扫描类词均包含「扫描」或「评估」）也无资产/目标指代时，不可能识别出评估目标：
+        # 查询类消息直接返回，跳过 IP/域名扫描与对话历史回溯
+        if is_query_message and not has_security_keyword and not has_asset_keyword:
+            intent['is_query'] = True
+            return intent
 
-        # 若消息中同时包含「评估/扫描」类词和 IP/域名，也视为安全评估（避免漏掉「对 101.37.29.229 扫描」等说法）
-        ipv4_in_msg = re.search(r'(?:\d{1,3}\.){3}\d{1,3}', user_message)
-        domain_in_msg = re.search(
-            r'(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}',
-            user_message
-        )
+        has_rescan_keyword = 'rescan' in hits
 
-        # 增强匹配：如果消息中包含IP/域名，且包含"资产"、"服务器"、"目标"、"对"等关键词，也视为安全评估意图
-        has_asset_keyword = any(kw in user_message for kw in ['资产', '服务器', '目标', '对', '云服务器'])
+        # 若消息中同时包含「评估/扫描」类词和 IP/域名，也视为安全评估（避免漏掉「对 101.37.29.229 扫描」等说法）
+        # 只扫描一次并在各分支复用；命中 IPv4 时域名结果不会被用到（目标优先取 IPv4），跳过域名扫描
+        ipv4_in_msg = IPV4_RE.search(user_message)
+        domain_in_msg = None if ipv4_in_msg else DOMAIN_RE.search(user_message)
 
         # 处理重新扫描的情况：从对话历史中提取之前扫描过的目标
         if has_rescan_keyword and not ipv4_in_msg and not domain_in_msg:
             # 从对话历史中查找最近扫描过的目标
-            if conversation_history:
-                # 倒序查找最近的 IP/域名
-                for msg in reversed(conversation_history):
-                    content = msg.get('content', '')
-                    # 查找 IPv4 地址
-                    ipv4_match = re.search(r'(?:\d{1,3}\.){3}\d{1,3}', content)
-                    if ipv4_match:
-                        intent['hexstrike_target'] = ipv4_match.group(0).strip()
-                        intent['needs_hexstrike_assessment'] = True
-                        logger.info(
-                            "意图分析：从对话历史中提取到重新扫描目标，target=%s",
-                            intent['hexstrike_target']
-                        )
-                        break
-                    # 查找域名
-                    domain_match = re.search(
-                        r'(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}',
-                        content
-                    )
-                    if domain_match:
-                        intent['hexstrike_target'] = domain_match.group(0).strip()
-                        intent['needs_hexstrike_assessment'] = True
-                        logger.info(
-                            "意图分析：从对话历史中提取到重新扫描目标，target=%s",
-                            intent['hexstrike_target']
-                        )
-                        break
+            history_target = find_history_target(conversation_history)
+            if history_target:
+                intent['hexstrike_target'] = history_target
+                intent['needs_hexstrike_assessment'] = True
 
         if has_security_keyword or (ipv4_in_msg and has_asset_keyword) or (domain_in_msg and has_asset_keyword):
             intent['needs_hexstrike_assessment'] = True
@@ -722,7 +1287,7 @@ class SecOpsAgent:
                 intent['hexstrike_target'] = domain_in_msg.group(0).strip()
             else:
                 # 简单主机名：连续字母数字与点、横线
-                host_match = re.search(r'([a-zA-Z0-9][a-zA-Z0-9.-]{2,50})', user_message)
+                host_match = HOST_RE.search(user_message)
                 if host_match:
                     intent['hexstrike_target'] = host_match.group(1).strip()
             logger.info(
@@ -734,50 +1299,33 @@ class SecOpsAgent:
         
         # 检查是否是查询类消息（介绍、说明、帮助等），这类消息不应该执行操作
         # 若已识别为安全评估且已提取目标，不按纯查询处理
-        query_keywords = [
-            '介绍', '说明', '帮助', 'help', '你是谁', '你能做什么', '你的功能',
-            '你的能力', '你能', '你会', '什么是', '如何', '怎么', '怎样',
-            '列出', '显示', '查看', '查询', '有哪些', '有什么'
-        ]
         if not (intent['needs_hexstrike_assessment'] and intent['hexstrike_target']):
-            if any(keyword in message_lower for keyword in query_keywords):
+            if is_query_message:
                 intent['is_query'] = True
                 # 查询类消息不执行操作，直接返回
                 return intent
         
         # 检查是否需要采集漏洞（更灵活的关键词匹配）
-        vuln_keywords = [
-            '采集漏洞', '收集漏洞', '捕获漏洞', '获取漏洞', '执行漏洞采集', '运行漏洞采集',
-            '最新漏洞', '漏洞信息', '漏洞数据', '漏洞采集', '漏洞收集'
-        ]
         # 检查是否包含"漏洞"和"采集/收集/捕获/获取"等动词
-        if any(keyword in message_lower for keyword in vuln_keywords):
+        if 'vuln' in hits:
             intent['needs_vulnerability_collection'] = True
-        elif '漏洞' in message_lower and any(verb in message_lower for verb in ['捕获', '采集', '收集', '获取', '抓取']):
+        elif 'vuln_word' in hits and 'vuln_verb' in hits:
             intent['needs_vulnerability_collection'] = True
         
         # 检查是否需要采集资产（更灵活的关键词匹配）
-        asset_keywords = [
-            '采集资产', '收集资产', '获取资产', '同步资产', '执行资产采集', '运行资产采集',
-            '资产信息', '资产数据', '资产采集', '资产收集'
-        ]
-        if any(keyword in message_lower for keyword in asset_keywords):
+        if 'asset' in hits:
             intent['needs_asset_collection'] = True
-        elif '资产' in message_lower and any(verb in message_lower for verb in ['采集', '收集', '获取', '同步']):
+        elif 'asset_word' in hits and 'asset_verb' in hits:
             intent['needs_asset_collection'] = True
         
         # 检查是否需要匹配（更灵活的关键词匹配）
-        match_keywords = [
-            '匹配漏洞', '检查影响', '检查受影响', '是否受影响', '执行匹配',
-            '影响资产', '受影响', '资产影响', '漏洞影响', '匹配资产'
-        ]
-        if any(keyword in message_lower for keyword in match_keywords):
+        if 'match' in hits:
             intent['needs_matching'] = True
-        elif ('资产' in message_lower or '影响' in message_lower) and ('检查' in message_lower or '匹配' in message_lower or '是否' in message_lower):
+        elif 'match_subject' in hits and 'match_verb' in hits:
             intent['needs_matching'] = True
         
         # 提取天数
-        days_match = re.search(r'(\d+)\s*天', user_message)
+        days_match = _DAYS_RE.search(user_message)
         if days_match:
             intent['days'] = int(days_match.group(1))
         
@@ -785,251 +1333,7 @@ class SecOpsAgent:
     
     def _build_system_prompt(self) -> str:
         """构建系统提示词"""
-        actions_desc = "\n".join([
-            f"- {action['name']}: {action['description']}" 
-            for action in AVAILABLE_ACTIONS
-        ])
-        
-        # 获取可用插件列表
-        plugins = Plugin.objects.filter(is_active=True)
-        plugins_desc = "\n".join([
-            f"- {p.name} ({p.get_plugin_type_display()})" 
-            for p in plugins
-        ])
-        
-        return f"""你是一个专业的安全运营(SecOps)智能助手，可以帮助用户执行安全运营任务和配置管理任务。
-
-可用操作：
-{actions_desc}
-
-可用插件：
-{plugins_desc}
-
-你的能力：
-1. 理解用户的安全运营需求
-2. 回答用户的问题和提供帮助（介绍、说明、查询等）
-3. 自动执行相应的任务（漏洞采集、资产采集、漏洞匹配等）- **仅在用户明确要求时执行**
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-4. 创建和管理定时任务（支持cron表达式和自然语言）
-5. 分析和解释执行结果
-6. 提供专业的安全建议
-7. **资产安全评估（HexStrike AI 集成）**：当用户要求对资产做安全评估、渗透测试或漏洞扫描时：
-   - 可先使用 list_assets 查询资产列表，获取要评估的目标（IP/域名/主机名）
-   - 使用 hexstrike_analyze_target(target) 对指定目标进行综合安全分析（由 HexStrike 智能选择扫描策略）
-   - 或使用 hexstrike_run_scan(tool_name, arguments) 执行指定工具（如 nmap_scan、nuclei_scan 等）
-   - 仅对用户拥有或明确授权的资产进行评估，并提醒用户确保已获得授权
-
-重要提示：
-- **当用户询问"介绍"、"说明"、"帮助"、"你是谁"、"你能做什么"等问题时，只回答，不要执行任何操作**
-- **只有在用户明确要求执行任务时（如"请执行漏洞采集"、"开始匹配"、"运行资产采集"等），才执行操作**
-- **不要因为响应中提到了操作名称就执行，必须用户明确要求执行**
-
-任务创建说明：
-- **重要**：只有插件相关的操作才能创建为定时任务。系统操作（如match_vulnerabilities）不能创建为定时任务。
-- 可创建定时任务的操作：
-  * collect_vulnerabilities（漏洞采集）- 使用插件：collect_oss_security
-  * collect_assets（资产采集）- 使用插件：data_aliyun_security
-- **不能创建定时任务的操作**：
-  * match_vulnerabilities（漏洞匹配）- 这是系统操作，不是插件，不能创建为定时任务
-  * 如果用户要求为match_vulnerabilities创建定时任务，应该说明这是系统操作，无法创建定时任务，但可以在漏洞采集和资产采集任务执行后自动执行匹配
-- 当用户要求创建定时任务时，使用create_task工具函数
-- cron表达式格式：分钟 小时 日 月 周（5个字段，用空格分隔）
-  * 示例：'0 0 * * *' 表示每天0点执行
-  * 示例：'0 */6 * * *' 表示每6小时执行一次（注意：*/6表示每6小时，不是/6）
-  * 示例：'0 0 * * 1' 表示每周一0点执行
-- 支持自然语言转换为cron表达式（使用parse_cron工具函数）：
-  * "每天0点" -> "0 0 * * *"
-  * "每小时" -> "0 * * * *"
-  * "每6小时" -> "0 */6 * * *"（注意：*/6，不是/6）
-  * "每周一0点" -> "0 0 * * 1"
-- 插件关键词匹配：
-  * "漏洞采集"、"CVE"、"oss-security"、"collect_oss_security" -> collect_oss_security插件
-  * "资产采集"、"asset"、"data_aliyun_security" -> data_aliyun_security插件
-- 创建任务时的注意事项：
-  * 如果用户要求创建多个任务的定时任务，应该为每个可创建的操作分别创建任务
-  * 如果用户要求为match_vulnerabilities创建定时任务，应该说明无法创建，但可以建议在漏洞采集和资产采集任务执行后，系统会自动执行匹配
-  * 创建任务成功后，只返回任务创建结果，不要执行操作
-
-**操作执行说明**：
-- `collect_vulnerabilities`、`collect_assets`、`match_vulnerabilities` 是**操作**，不是工具函数
-- 这些操作**不能**通过Function Calling调用，它们不在TOOLS列表中
-- 当用户要求执行这些操作时（如"捕获漏洞"、"检查资产"等），系统会自动通过意图分析来触发执行
-- **绝对不要**尝试调用这些操作作为工具函数，如果AI尝试调用，系统会自动回退到操作执行方式
-
-工作流程：
-1. 理解用户的意图
-2. 如果是查询类消息（介绍、说明、帮助等），只回答，不执行任何操作
-3. 如果需要创建或修改任务，使用相应的工具函数（create_task、update_task、list_tasks）
-4. 如果用户明确要求执行操作（如"捕获漏洞"、"检查资产"等），系统会自动通过意图分析来执行，不需要调用工具函数
-5. 如果用户要求对资产做安全评估、渗透测试或漏洞扫描，使用 list_assets 获取目标，再使用 hexstrike_analyze_target 或 hexstrike_run_scan（需 HexStrike 服务已启动）
-6. 执行操作后，分析和总结结果
-
-请用友好、专业的语气回复用户。"""
+        return _render_system_prompt(_get_plugins_desc())
     
     def _extract_actions(self, response: str, intent_analysis: Dict[str, Any] = None, 
                         user_message: str = None) -> List[Dict[str, Any]]:
@@ -1052,16 +1356,13 @@ class SecOpsAgent:
             return []
         
         # 如果用户消息中包含"创建"、"设置"、"配置"等词，且没有"执行"、"运行"等词，则不执行操作
-        if user_message:
-            user_msg_lower = user_message.lower()
-            create_keywords = ['创建', '设置', '配置', '建立', '添加']
-            execute_keywords = ['执行', '运行', '开始', '启动', '进行']
-            
-            has_create_keyword = any(kw in user_msg_lower for kw in create_keywords)
-            has_execute_keyword = any(kw in user_msg_lower for kw in execute_keywords)
+        hits = _keyword_hits(user_message) if user_message else ()
+        has_create_keyword = 'create' in hits
+        if has_create_keyword:
+            has_execute_keyword = 'execute' in hits
             
             # 如果用户只是要求创建/设置任务，而不是执行操作，则不执行操作
-            if has_create_keyword and not has_execute_keyword:
+            if not has_execute_keyword:
                 logger.debug("用户只是要求创建/设置任务，不执行操作")
                 return []
         
@@ -1082,13 +1383,9 @@ class SecOpsAgent:
         # 注意：只有在用户明确要求执行操作时才提取，不要从AI的说明性回复中提取
         if not actions:
             # 如果用户只是要求创建/设置任务，不从JSON中提取操作
-            if user_message:
-                user_msg_lower = user_message.lower()
-                create_keywords = ['创建', '设置', '配置', '建立', '添加']
-                has_create_keyword = any(kw in user_msg_lower for kw in create_keywords)
-                if has_create_keyword:
-                    logger.debug("用户只是要求创建/设置任务，不从JSON中提取操作")
-                    return []
+            if has_create_keyword:
+                logger.debug("用户只是要求创建/设置任务，不从JSON中提取操作")
+                return []
             
             try:
                 # 查找JSON块
@@ -1097,7 +1394,7 @@ class SecOpsAgent:
                 
                 if json_start >= 0 and json_end > json_start:
                     json_str = response[json_start:json_end]
-                    data = json.loads(json_str)
+                    data = json_loads(json_str)
                     
                     if 'actions' in data and isinstance(data['actions'], list):
                         actions = data['actions']
@@ -1126,14 +1423,12 @@ class SecOpsAgent:
         action_name = action.get('name')
         parameters = action.get('parameters', {})
         
-        if action_name == 'collect_vulnerabilities':
-            yield from self._collect_vulnerabilities(parameters, user)
-        elif action_name == 'match_vulnerabilities':
-            yield from self._match_vulnerabilities(parameters, user)
-        elif action_name == 'collect_assets':
-            yield from self._collect_assets(parameters, user)
-        else:
+        # 操作名可能来自模型输出的 JSON，非字符串时视为未知操作
+        handler_name = self._ACTION_HANDLERS.get(action_name) if isinstance(action_name, str) else None
+        if handler_name is None:
             yield f"❌ 未知操作: {action_name}\n"
+            return
+        yield from getattr(self, handler_name)(parameters, user)
     
     def _collect_vulnerabilities(self, parameters: Dict[str, Any], user=None) -> Generator[str, None, None]:
         """采集漏洞"""
@@ -1169,13 +1464,18 @@ class SecOpsAgent:
         from django.utils import timezone
         
         since_date = timezone.now() - timedelta(days=days)
-        vulnerabilities = Vulnerability.objects.filter(collected_at__gte=since_date).order_by('-published_date', '-collected_at')
-        count = vulnerabilities.count()
+        # 只加载列表展示用到的字段
+        vulnerabilities = Vulnerability.objects.filter(
+            collected_at__gte=since_date
+        ).order_by('-published_date', '-collected_at').only('cve_id', 'content')
+        # 多取一条即可判断是否超过10个：不超过时直接用列表长度作为总数，省去 COUNT 查询
+        top_vulnerabilities = list(vulnerabilities[:11])
+        count = len(top_vulnerabilities) if len(top_vulnerabilities) <= 10 else vulnerabilities.count()
         
         # 显示捕获的漏洞列表（简化格式）
         if count > 0:
             yield f"\n**📋 捕获的漏洞列表（共 {count} 条）**\n\n"
-            for idx, vuln in enumerate(vulnerabilities[:10], 1):  # 只显示前10个
+            for idx, vuln in enumerate(top_vulnerabilities[:10], 1):  # 只显示前10个
                 content = vuln.content if isinstance(vuln.content, dict) else {}
                 severity = content.get('severity', '')
                 affected_component = content.get('affected_component', '').strip()
@@ -1183,19 +1483,11 @@ class SecOpsAgent:
                 # 根据危害等级添加emoji
                 severity_text = ""
                 if severity and severity != '未知':
-                    severity_emoji = {
-                        'Critical': '🔴',
-                        'High': '🟠',
-                        'Medium': '🟡',
-                        'Moderate': '🟡',
-                        'Low': '🟢',
-                        'Important': '🟠'
-                    }
-                    emoji = severity_emoji.get(severity, '⚪')
+                    emoji = SEVERITY_EMOJI.get(severity, '⚪')
                     severity_text = f"{emoji} {severity}"
                 
                 component_text = ""
-                if affected_component and affected_component not in ['未知', ''] and self._is_valid_component_name(affected_component):
+                if affected_component and affected_component != '未知' and _is_valid_component_name(affected_component):
                     component_text = f" | 影响组件: {affected_component}"
                 
                 yield f"{idx}. **{vuln.cve_id}**"
@@ -1268,20 +1560,12 @@ class SecOpsAgent:
             severity = content.get('severity', '')
             severity_text = ""
             if severity:
-                severity_emoji = {
-                    'Critical': '🔴',
-                    'High': '🟠',
-                    'Medium': '🟡',
-                    'Moderate': '🟡',
-                    'Low': '🟢',
-                    'Important': '🟠'
-                }
-                emoji = severity_emoji.get(severity, '⚪')
+                emoji = SEVERITY_EMOJI.get(severity, '⚪')
                 severity_text = f" ({emoji} {severity})"
             
             affected_component = content.get('affected_component', '').strip()
             component_text = ""
-            if affected_component and self._is_valid_component_name(affected_component):
+            if affected_component and _is_valid_component_name(affected_component):
                 component_text = f" | 影响组件: {affected_component}"
             
             yield f"**{idx}. {cve_id}**{severity_text}{component_text}\n"
@@ -1455,7 +1739,7 @@ class SecOpsAgent:
                     execution.result = result.get('data', {})
                     if not result.get('success'):
                         execution.error_message = result.get('message', '执行失败')
-                    execution.save()
+                    execution.save(update_fields=HexStrikeExecution.RESULT_FIELDS)
                     
                     if result.get('success') and result.get('data') is not None:
                         return {
@@ -1477,7 +1761,7 @@ class SecOpsAgent:
                     execution.finished_at = timezone.now()
                     execution.execution_time = execution_time
                     execution.error_message = str(e)
-                    execution.save()
+                    execution.save(update_fields=HexStrikeExecution.FAILURE_FIELDS)
                     raise
             
             elif function_name == 'hexstrike_run_scan':
@@ -1490,7 +1774,7 @@ class SecOpsAgent:
                 arguments = function_args.get('arguments')
                 if isinstance(arguments, str):
                     try:
-                        arguments = json.loads(arguments)
+                        arguments = json_loads(arguments)
                     except json.JSONDecodeError:
                         arguments = {}
                 if not tool_name:
@@ -1581,7 +1865,7 @@ class SecOpsAgent:
                     execution.result = result.get('data', {})
                     if not result.get('success'):
                         execution.error_message = result.get('message', '执行失败')
-                    execution.save()
+                    execution.save(update_fields=HexStrikeExecution.RESULT_FIELDS)
                     
                     if result.get('success') and result.get('data') is not None:
                         return {
@@ -1603,7 +1887,7 @@ class SecOpsAgent:
                     execution.finished_at = timezone.now()
                     execution.execution_time = execution_time
                     execution.error_message = str(e)
-                    execution.save()
+                    execution.save(update_fields=HexStrikeExecution.FAILURE_FIELDS)
                     raise
             
             else:
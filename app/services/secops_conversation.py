@@ -3,21 +3,30 @@ SecOps 统一对话服务
 处理所有对话逻辑（意图分析、工具调用、HexStrike 集成等）
 提供统一的接口给前端和钉钉机器人
 """
+import copy
 import json
 import logging
 import re
 import subprocess
 import sys
 import time
+from functools import lru_cache
 from typing import Dict, Any, List, Optional, Generator, Tuple
 from django.conf import settings
 from django.utils import timezone
 
 from app.services.response_formatter import ResponseFormatter
 from app.services.hexstrike_client import HexStrikeClient
+from app.services.intent_targets import IPV4_RE, DOMAIN_RE, HOST_RE, find_history_target
 
 logger = logging.getLogger(__name__)
 
+# 意图分析结果缓存条目数（调试、重试时常重复发送相同消息）
+INTENT_CACHE_SIZE = 256
+
+# 重新扫描/再次扫描的关键词（从对话历史中提取目标）
+RESCAN_KEYWORDS = ('重新扫描', '再扫描一次', '再次扫描', '再评估', '重新评估', '扫描这个', '再次评估')
+
 
 # 可用操作列表
 AVAILABLE_ACTIONS = [
@@ -59,6 +68,106 @@ class ConversationIntent:
         self.is_query = False  # 是否是查询类消息
 
 
+@lru_cache(maxsize=INTENT_CACHE_SIZE)
+def _analyze_message_intent(user_message: str,
+                            history_target: Optional[str]) -> Tuple[ConversationIntent, Optional[Tuple[bool, bool]]]:
+    """
+    按消息内容分析意图（结果只取决于消息与历史目标，按二者缓存）
+
+    调用方需拷贝返回的意图后再修改，避免污染缓存。
+
+    Returns:
+        Tuple: (意图分析结果, 识别到安全评估意图时的 (has_security_keyword, has_asset_keyword)，否则为 None)；
+        日志由调用方输出，缓存命中时同样会记录
+    """
+    assessment_flags = None
+    message_lower = user_message.lower()
+    intent = ConversationIntent()
+
+    # 1. 先识别「安全评估」类意图并提取目标
+    security_assessment_keywords = [
+        '安全评估', '渗透测试', '漏洞扫描', '全面评估', '全面的安全评估', '全面安全评估',
+        '安全扫描', '扫描一下', '做一次评估', '做一次扫描', '评估', '扫描'
+    ]
+
+    has_security_keyword = any(kw in user_message for kw in security_assessment_keywords)
+
+    # 提取 IP/域名
+    # 命中 IPv4 时域名结果不会被用到（目标优先取 IPv4），跳过域名扫描
+    ipv4_in_msg = IPV4_RE.search(user_message)
+    domain_in_msg = None if ipv4_in_msg else DOMAIN_RE.search(user_message)
+
+    # 增强匹配：如果消息中包含IP/域名，且包含"资产"、"服务器"、"目标"、"对"等关键词
+    has_asset_keyword = any(kw in user_message for kw in ['资产', '服务器', '目标', '对', '云服务器'])
+
+    # 重新扫描时使用从对话历史中解析出的目标
+    if history_target:
+        intent.hexstrike_target = history_target
+        intent.needs_hexstrike_assessment = True
+
+    if has_security_keyword or (ipv4_in_msg and has_asset_keyword) or (domain_in_msg and has_asset_keyword):
+        intent.needs_hexstrike_assessment = True
+        # 提取目标：优先 IPv4
+        if ipv4_in_msg:
+            intent.hexstrike_target = ipv4_in_msg.group(0).strip()
+        elif domain_in_msg:
+            intent.hexstrike_target = domain_in_msg.group(0).strip()
+        else:
+            # 简单主机名：连续字母数字与点、横线
+            host_match = HOST_RE.search(user_message)
+            if host_match:
+                intent.hexstrike_target = host_match.group(1).strip()
+        assessment_flags = (has_security_keyword, has_asset_keyword)
+
+    # 2. 检查是否是查询类消息
+    query_keywords = [
+        '介绍', '说明', '帮助', 'help', '你是谁', '你能做什么', '你的功能',
+        '你的能力', '你能', '你会', '什么是', '如何', '怎么', '怎样',
+        '列出', '显示', '查看', '查询', '有哪些', '有什么'
+    ]
+    if not (intent.needs_hexstrike_assessment and intent.hexstrike_target):
+        if any(keyword in message_lower for keyword in query_keywords):
+            intent.is_query = True
+            return intent, assessment_flags
+
+    # 3. 检查是否需要采集漏洞
+    vuln_keywords = [
+        '采集漏洞', '收集漏洞', '捕获漏洞', '获取漏洞', '执行漏洞采集', '运行漏洞采集',
+        '最新漏洞', '漏洞信息', '漏洞数据', '漏洞采集', '漏洞收集'
+    ]
+    if any(keyword in message_lower for keyword in vuln_keywords):
+        intent.needs_vulnerability_collection = True
+    elif '漏洞' in message_lower and any(verb in message_lower for verb in ['捕获', '采集', '收集', '获取', '抓取']):
+        intent.needs_vulnerability_collection = True
+
+    # 4. 检查是否需要采集资产
+    asset_keywords = [
+        '采集资产', '收集资产', '获取资产', '同步资产', '执行资产采集', '运行资产采集',
+        '资产信息', '资产数据', '资产采集', '资产收集'
+    ]
+    if any(keyword in message_lower for keyword in asset_keywords):
+        intent.needs_asset_collection = True
+    elif '资产' in message_lower and any(verb in message_lower for verb in ['采集', '收集', '获取', '同步']):
+        intent.needs_asset_collection = True
+
+    # 5. 检查是否需要匹配
+    match_keywords = [
+        '匹配漏洞', '检查影响', '检查受影响', '是否受影响', '执行匹配',
+        '影响资产', '受影响', '资产影响', '漏洞影响', '匹配资产'
+    ]
+    if any(keyword in message_lower for keyword in match_keywords):
+        intent.needs_matching = True
+    elif ('资产' in message_lower or '影响' in message_lower) and ('检查' in message_lower or '匹配' in message_lower or '是否' in message_lower):
+        intent.needs_matching = True
+
+    # 6. 提取天数
+    days_match = re.search(r'(\d+)\s*天', user_message)
+    if days_match:
+        intent.days = int(days_match.group(1))
+
+    return intent, assessment_flags
+
+
 class SecOpsConversationService:
     """
     SecOps 统一对话服务
@@ -129,127 +238,21 @@ class SecOpsConversationService:
         Returns:
             ConversationIntent: 意图分析结果
         """
-        message_lower = user_message.lower()
-        intent = ConversationIntent()
-
-        # 1. 先识别「安全评估」类意图并提取目标
-        security_assessment_keywords = [
-            '安全评估', '渗透测试', '漏洞扫描', '全面评估', '全面的安全评估', '全面安全评估',
-            '安全扫描', '扫描一下', '做一次评估', '做一次扫描', '评估', '扫描'
-        ]
-
-        # 重新扫描/再次扫描的关键词（从对话历史中提取目标）
-        rescan_keywords = ['重新扫描', '再扫描一次', '再次扫描', '再评估', '重新评估', '扫描这个', '再次评估']
-
-        has_security_keyword = any(kw in user_message for kw in security_assessment_keywords)
-        has_rescan_keyword = any(kw in user_message for kw in rescan_keywords)
-
-        # 提取 IP/域名
-        ipv4_in_msg = re.search(r'(?:\d{1,3}\.){3}\d{1,3}', user_message)
-        domain_in_msg = re.search(
-            r'(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}',
-            user_message
-        )
-
-        # 增强匹配：如果消息中包含IP/域名，且包含"资产"、"服务器"、"目标"、"对"等关键词
-        has_asset_keyword = any(kw in user_message for kw in ['资产', '服务器', '目标', '对', '云服务器'])
-
-        # 处理重新扫描的情况：从对话历史中提取之前扫描过的目标
-        if has_rescan_keyword and not ipv4_in_msg and not domain_in_msg:
-            if conversation_history:
-                # 倒序查找最近的 IP/域名
-                for msg in reversed(conversation_history):
-                    content = msg.get('content', '')
-                    # 查找 IPv4 地址
-                    ipv4_match = re.search(r'(?:\d{1,3}\.){3}\d{1,3}', content)
-                    if ipv4_match:
-                        intent.hexstrike_target = ipv4_match.group(0).strip()
-                        intent.needs_hexstrike_assessment = True
-                        logger.info(
-                            "意图分析：从对话历史中提取到重新扫描目标，target=%s",
-                            intent.hexstrike_target
-                        )
-                        break
-                    # 查找域名
-                    domain_match = re.search(
-                        r'(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]*[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}',
-                        content
-                    )
-                    if domain_match:
-                        intent.hexstrike_target = domain_match.group(0).strip()
-                        intent.needs_hexstrike_assessment = True
-                        logger.info(
-                            "意图分析：从对话历史中提取到重新扫描目标，target=%s",
-                            intent.hexstrike_target
-                        )
-                        break
-
-        if has_security_keyword or (ipv4_in_msg and has_asset_keyword) or (domain_in_msg and has_asset_keyword):
-            intent.needs_hexstrike_assessment = True
-            # 提取目标：优先 IPv4
-            if ipv4_in_msg:
-                intent.hexstrike_target = ipv4_in_msg.group(0).strip()
-            elif domain_in_msg:
-                intent.hexstrike_target = domain_in_msg.group(0).strip()
-            else:
-                # 简单主机名：连续字母数字与点、横线
-                host_match = re.search(r'([a-zA-Z0-9][a-zA-Z0-9.-]{2,50})', user_message)
-                if host_match:
-                    intent.hexstrike_target = host_match.group(1).strip()
+        history_target = None
+        # 处理重新扫描的情况：消息中没有目标时，从对话历史中提取之前扫描过的目标
+        if (conversation_history and any(kw in user_message for kw in RESCAN_KEYWORDS)
+                and not IPV4_RE.search(user_message) and not DOMAIN_RE.search(user_message)):
+            history_target = find_history_target(conversation_history)
+        intent, assessment_flags = _analyze_message_intent(user_message, history_target)
+        if assessment_flags:
+            has_security_keyword, has_asset_keyword = assessment_flags
             logger.info(
                 "意图分析：识别到安全评估意图，target=%s, has_security_keyword=%s, has_asset_keyword=%s",
                 intent.hexstrike_target,
                 has_security_keyword,
                 has_asset_keyword
             )
-
-        # 2. 检查是否是查询类消息
-        query_keywords = [
-            '介绍', '说明', '帮助', 'help', '你是谁', '你能做什么', '你的功能',
-            '你的能力', '你能', '你会', '什么是', '如何', '怎么', '怎样',
-            '列出', '显示', '查看', '查询', '有哪些', '有什么'
-        ]
-        if not (intent.needs_hexstrike_assessment and intent.hexstrike_target):
-            if any(keyword in message_lower for keyword in query_keywords):
-                intent.is_query = True
-                return intent
-
-        # 3. 检查是否需要采集漏洞
-        vuln_keywords = [
-            '采集漏洞', '收集漏洞', '捕获漏洞', '获取漏洞', '执行漏洞采集', '运行漏洞采集',
-            '最新漏洞', '漏洞信息', '漏洞数据', '漏洞采集', '漏洞收集'
-        ]
-        if any(keyword in message_lower for keyword in vuln_keywords):
-            intent.needs_vulnerability_collection = True
-        elif '漏洞' in message_lower and any(verb in message_lower for verb in ['捕获', '采集', '收集', '获取', '抓取']):
-            intent.needs_vulnerability_collection = True
-
-        # 4. 检查是否需要采集资产
-        asset_keywords = [
-            '采集资产', '收集资产', '获取资产', '同步资产', '执行资产采集', '运行资产采集',
-            '资产信息', '资产数据', '资产采集', '资产收集'
-        ]
-        if any(keyword in message_lower for keyword in asset_keywords):
-            intent.needs_asset_collection = True
-        elif '资产' in message_lower and any(verb in message_lower for verb in ['采集', '收集', '获取', '同步']):
-            intent.needs_asset_collection = True
-
-        # 5. 检查是否需要匹配
-        match_keywords = [
-            '匹配漏洞', '检查影响', '检查受影响', '是否受影响', '执行匹配',
-            '影响资产', '受影响', '资产影响', '漏洞影响', '匹配资产'
-        ]
-        if any(keyword in message_lower for keyword in match_keywords):
-            intent.needs_matching = True
-        elif ('资产' in message_lower or '影响' in message_lower) and ('检查' in message_lower or '匹配' in message_lower or '是否' in message_lower):
-            intent.needs_matching = True
-
-        # 6. 提取天数
-        days_match = re.search(r'(\d+)\s*天', user_message)
-        if days_match:
-            intent.days = int(days_match.group(1))
-
-        return intent
+        return copy.copy(intent)
 
     def call_hexstrike_analyze(
         self,
@@ -369,7 +372,7 @@ class SecOpsConversationService:
             execution.result = result.get('data', {})
             if not result.get('success'):
                 execution.error_message = result.get('message', '执行失败')
-            execution.save()
+            execution.save(update_fields=HexStrikeExecution.RESULT_FIELDS)
 
             if result.get('success') and result.get('data') is not None:
                 return {
@@ -392,7 +395,7 @@ class SecOpsConversationService:
             execution.finished_at = timezone.now()
             execution.execution_time = execution_time
             execution.error_message = str(e)
-            execution.save()
+            execution.save(update_fields=HexStrikeExecution.FAILURE_FIELDS)
 
             logger.error(f"调用 HexStrike 失败: {e}", exc_info=True)
             return {
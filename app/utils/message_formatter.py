@@ -151,8 +151,7 @@ def format_vulnerability_list_markdown(vulnerabilities: List, max_items: int = 2
         # 只显示有效的组件名称
         if affected_component and affected_component not in ['未知', '']:
             from app.services.secops_agent import SecOpsAgent
-            agent = SecOpsAgent('', '', '')
-            if agent._is_valid_component_name(affected_component):
+            if SecOpsAgent._is_valid_component_name(affected_component):
                 lines.append(f"**影响组件**: {affected_component}")
         
         lines.append("")  # 空行分隔
@@ -221,8 +220,7 @@ def format_match_result_markdown(matches: List, vuln_count: int) -> str:
         affected_component = content.get('affected_component', '').strip()
         if affected_component:
             from app.services.secops_agent import SecOpsAgent
-            agent = SecOpsAgent('', '', '')
-            if agent._is_valid_component_name(affected_component):
+            if SecOpsAgent._is_valid_component_name(affected_component):
                 lines.append(f"**影响组件**: {affected_component}")
         
         affected_versions = content.get('affected_versions', '').strip()
@@ -253,4 +253,6 @@ HEXSTRIKE_TIMEOUT = int(os.environ.get('HEXSTRIKE_TIMEOUT', '600'))  # 10分钟
 # 用于 SecOps 智能体和 LangChain 集成
 # 参考: https://help.aliyun.com/zh/dashscope/
 QWEN_API_KEY = os.environ.get('QWEN_API_KEY', '')
-QWEN_MODEL = os.environ.get('QWEN_MODEL', 'qwen-plus')  # 可选: qwen-turbo, qwen-plus, qwen-max
\ No newline at end of file
+QWEN_MODEL = os.environ.get('QWEN_MODEL', 'qwen-plus')  # 可选: qwen-turbo, qwen-plus, qwen-max
+# 系统提示词静态部分以 cache_control 内容段发送（DashScope 显式缓存）；接入不支持该格式的兼容接口时保持关闭
+QWEN_PROMPT_CACHE_CONTROL = os.environ.get('QWEN_PROMPT_CACHE_CONTROL', 'false').lower() in ('1', 'true', 'yes')